@@ -1,11 +1,23 @@
-from typing import TypedDict, List, Optional, Union, TypeVar
+from typing import TypedDict, List, Optional, Union, TypeVar, Callable, Iterator, Sequence
 import json
+import queue
+import threading
 
-from lib.state_machine import StateMachine, Step, EntryPoint, Termination, Run
-from lib.llm import LLM
-from lib.messages import AIMessage, UserMessage, SystemMessage, ToolMessage
+from lib.state_machine import StateMachine, Step, EntryPoint, Termination, Run, Resource
+from lib.llm import LLM, ConnectionPool
+from lib.cache import CompletionCache
+from lib.messages import AIMessage, AnyMessage, UserMessage, SystemMessage, ToolMessage
 from lib.tooling import Tool, ToolCall
 from lib.memory import ShortTermMemory
+from lib.checkpoint import Checkpointer
+from lib.context import ContextWindow, count_message_tokens
+from lib.logs import get_logger
+
+
+logger = get_logger(__name__)
+
+# Step fitting the conversation in the context window, bookkeeping rather than an agent action
+CONTEXT_STEP_ID = "context_window"
 
 # Define the state schema
 class AgentState(TypedDict):
@@ -14,13 +26,21 @@ class AgentState(TypedDict):
     messages: List[dict]  # List of conversation messages
     current_tool_calls: Optional[List[ToolCall]]  # Current pending tool calls
     total_tokens: int  # Track the cumulative total
+    prompt_tokens: int  # Cumulative prompt tokens of the run
+    completion_tokens: int  # Cumulative completion tokens of the run
+    context_tokens: int  # Tokens of the messages sent in the last LLM call
     
 class Agent:
     def __init__(self, 
                  model_name: str,
                  instructions: str, 
                  tools: List[Tool] = None,
-                 temperature: float = 0.7):
+                 temperature: float = 0.7,
+                 checkpointer: Optional[Checkpointer] = None,
+                 pool: Optional[ConnectionPool] = None,
+                 cache: Optional[CompletionCache] = None,
+                 memory: Optional[ShortTermMemory] = None,
+                 context_window: Optional[ContextWindow] = None):
         """
         Initialize an Agent
         
@@ -29,14 +49,31 @@ class Agent:
             instructions: System instructions for the agent
             tools: Optional list of tools available to the agent
             temperature: Temperature parameter for LLM (default: 0.7)
+            checkpointer: Optional store persisting each step so an interrupted
+                invoke can be continued with `resume`
+            pool: Optional settings of the HTTP connection pool of the LLM
+            cache: Optional completion cache, used when the temperature is 0
+            memory: Optional session memory, e.g. backed by SQLite or Redis so
+                that any worker can serve any session (default: in-process)
+            context_window: Optional token budget of the conversation. By default,
+                or without a budget, the whole history is sent.
         """
         self.instructions = instructions
         self.tools = tools if tools else []
         self.model_name = model_name
         self.temperature = temperature
+        self.checkpointer = checkpointer
+        self.pool = pool
+        self.cache = cache
+        self.context_window = context_window
+        # Without a budget, the conversation is sent whole and only counted in the LLM step
+        self._fits_context = context_window is not None and context_window.has_budget
+
+        # One LLM for the lifetime of the agent, so every turn reuses its connections
+        self.llm = self._create_llm()
         
         # Initialize memory and state machine
-        self.memory = ShortTermMemory()
+        self.memory = memory or ShortTermMemory()
         self.workflow = self._create_state_machine()
 
     def _prepare_messages_step(self, state: AgentState) -> AgentState:
@@ -47,42 +84,85 @@ class Agent:
         if not messages:
             messages = [SystemMessage(content=state["instructions"])]
             
-        # Add the new user message
-        messages.append(UserMessage(content=state["user_query"]))
+        # Add the new user message. Build a new list: the previous one is shared
+        # with the snapshots of earlier runs.
+        messages = messages + [UserMessage(content=state["user_query"])]
         
         return {
             "messages": messages,
             "session_id": state["session_id"]
         }
 
-    def _llm_step(self, state: AgentState) -> AgentState:
-        """Step logic: Process the current state through the LLM"""
-        # Initialize LLM
-        llm = LLM(
+    def _context_step(self, state: AgentState) -> AgentState:
+        """Step logic: Fit the conversation in the context window before an LLM call"""
+        fitted = self.context_window.fit(state["messages"], state["session_id"])
+        logger.info("[Agent] Context: %d tokens in %d messages (%d dropped)",
+                    fitted.tokens, len(fitted.messages), fitted.dropped,
+                    extra={"session_id": state["session_id"]})
+
+        update = {"context_tokens": fitted.tokens}
+        if fitted.messages is not state["messages"]:
+            update["messages"] = fitted.messages
+        return update
+
+    def _create_llm(self) -> LLM:
+        return LLM(
             model=self.model_name,
             temperature=self.temperature,
-            tools=self.tools
+            tools=self.tools,
+            pool=self.pool,
+            cache=self.cache,
         )
 
-        response = llm.invoke(state["messages"])
+    def _llm_update(self, state: AgentState, response: AIMessage) -> AgentState:
+        """Build the state update for an LLM response"""
         tool_calls = response.tool_calls if response.tool_calls else None
 
-        current_total = state.get("total_tokens", 0)
-        if response.token_usage:
-            current_total += response.token_usage.total_tokens
+        usage = response.token_usage
 
-        # Create AI message with content and tool calls
+        # Create AI message with content and tool calls. The usage is kept in the
+        # state rather than in the message, which is sent back to the LLM.
         ai_message = AIMessage(
             content=response.content, 
             tool_calls=tool_calls,
         )
 
-        return {
+        update = {
             "messages": state["messages"] + [ai_message],
             "current_tool_calls": tool_calls,
             "session_id": state["session_id"],
-            "total_tokens": current_total,
+            "total_tokens": state.get("total_tokens", 0) + (usage.total_tokens if usage else 0),
+            "prompt_tokens": state.get("prompt_tokens", 0) + (usage.prompt_tokens if usage else 0),
+            "completion_tokens": state.get("completion_tokens", 0) + (usage.completion_tokens if usage else 0),
         }
+        if not self._fits_context:
+            update["context_tokens"] = self._count_context(state["messages"])
+        return update
+
+    def _count_context(self, messages: List[AnyMessage]) -> int:
+        if self.context_window is not None:
+            return self.context_window.count(messages)
+        return sum(count_message_tokens(m, self.model_name) for m in messages)
+
+    def _llm_step(self, state: AgentState, resource: Optional[Resource] = None) -> AgentState:
+        """Step logic: Process the current state through the LLM, streaming the
+        tokens to the `on_token` callback of the resource if there is one"""
+        on_token = resource.vars.get("on_token") if resource else None
+        if on_token is None:
+            response = self.llm.invoke(state["messages"])
+            return self._llm_update(state, response)
+
+        for chunk in self.llm.stream(state["messages"]):
+            if isinstance(chunk, str):
+                on_token(chunk)
+            else:
+                response = chunk
+        return self._llm_update(state, response)
+
+    async def _allm_step(self, state: AgentState, resource: Optional[Resource] = None) -> AgentState:
+        """Async step logic: Process the current state through the LLM"""
+        response = await self.llm.ainvoke(state["messages"])
+        return self._llm_update(state, response)
 
     def _tool_step(self, state: AgentState) -> AgentState:
         """Step logic: Execute any pending tool calls"""
@@ -114,20 +194,29 @@ class Agent:
 
     def _create_state_machine(self) -> StateMachine[AgentState]:
         """Create the internal state machine for the agent"""
-        machine = StateMachine[AgentState](AgentState)
+        machine = StateMachine[AgentState](AgentState, checkpointer=self.checkpointer)
         
         # Create steps
         entry = EntryPoint[AgentState]()
         message_prep = Step[AgentState]("message_prep", self._prepare_messages_step)
-        llm_processor = Step[AgentState]("llm_processor", self._llm_step)
+        llm_processor = Step[AgentState]("llm_processor", self._llm_step, async_logic=self._allm_step)
         tool_executor = Step[AgentState]("tool_executor", self._tool_step)
         termination = Termination[AgentState]()
         
         machine.add_steps([entry, message_prep, llm_processor, tool_executor, termination])
-        
+
+        # Fit the conversation before every LLM call, only when it has a budget so
+        # that unbudgeted runs keep their steps
+        before_llm = llm_processor
+        if self._fits_context:
+            before_llm = Step[AgentState](CONTEXT_STEP_ID, self._context_step)
+            machine.add_steps([before_llm])
+
         # Add transitions
         machine.connect(entry, message_prep)
-        machine.connect(message_prep, llm_processor)
+        machine.connect(message_prep, before_llm)
+        if before_llm is not llm_processor:
+            machine.connect(before_llm, llm_processor)
         
         # Transition based on whether there are tool calls
         def check_tool_calls(state: AgentState) -> Union[Step[AgentState], str]:
@@ -137,23 +226,14 @@ class Agent:
             return termination
         
         machine.connect(llm_processor, [tool_executor, termination], check_tool_calls)
-        machine.connect(tool_executor, llm_processor)  # Go back to llm after tool execution
-        
-        return machine
+        machine.connect(tool_executor, before_llm)  # Go back to llm after tool execution
 
-    def invoke(self, query: str, session_id: Optional[str] = None) -> Run:
-        """
-        Run the agent on a query
+        # Validate the graph now rather than on the first run
+        machine.compile()
         
-        Args:
-            query: The user's query to process
-            session_id: Optional session identifier (uses "default" if None)
-            
-        Returns:
-            The final run object after processing
-        """
-        session_id = session_id or "default"
+        return machine
 
+    def _initial_state(self, query: str, session_id: str) -> AgentState:
         # Create session if it doesn't exist
         self.memory.create_session(session_id)
 
@@ -165,7 +245,7 @@ class Agent:
             if last_state:
                 previous_messages = last_state["messages"]
 
-        initial_state: AgentState = {
+        return {
             "user_query": query,
             "instructions": self.instructions,
             "messages": previous_messages,
@@ -173,21 +253,128 @@ class Agent:
             "session_id": session_id,
         }
 
-        run_object = self.workflow.run(initial_state)
+    def invoke(self, query: str, session_id: Optional[str] = None,
+               run_id: Optional[str] = None,
+               on_token: Optional[Callable[[str], None]] = None) -> Run:
+        """
+        Run the agent on a query
+        
+        Args:
+            query: The user's query to process
+            session_id: Optional session identifier (uses "default" if None)
+            run_id: Optional run identifier, needed to `resume` a checkpointed run
+            on_token: Optional callback receiving the LLM tokens as they are
+                generated. LLM responses are streamed when it is set.
+            
+        Returns:
+            The final run object after processing
+        """
+        session_id = session_id or "default"
+        initial_state = self._initial_state(query, session_id)
+
+        resource = Resource(vars={"on_token": on_token}) if on_token else None
+        run_object = self.workflow.run(initial_state, resource=resource, run_id=run_id)
+        
+        # Store the complete run object in memory
+        self.memory.add(run_object, session_id)
+        
+        return run_object
+
+    def stream(self, query: str, session_id: Optional[str] = None,
+               run_id: Optional[str] = None) -> Iterator[Union[str, Run]]:
+        """
+        Run the agent on a query, yielding the LLM tokens as they are generated
         
+        The workflow runs in a background thread, so tool calls and the next
+        steps go on while the tokens are consumed. The final run object is
+        yielded last.
+        
+        Args:
+            query: The user's query to process
+            session_id: Optional session identifier (uses "default" if None)
+            run_id: Optional run identifier, needed to `resume` a checkpointed run
+            
+        Example:
+            >>> for chunk in agent.stream("What is the best selling game?"):
+            ...     if isinstance(chunk, str):
+            ...         print(chunk, end="", flush=True)
+            ...     else:
+            ...         run = chunk
+        """
+        chunks = queue.SimpleQueue()
+        done = object()
+
+        def run_workflow():
+            try:
+                chunks.put(self.invoke(query, session_id, run_id, on_token=chunks.put))
+            except BaseException as e:
+                chunks.put(e)
+            finally:
+                chunks.put(done)
+
+        threading.Thread(target=run_workflow, daemon=True).start()
+        while (chunk := chunks.get()) is not done:
+            if isinstance(chunk, BaseException):
+                raise chunk
+            yield chunk
+
+    async def ainvoke(self, query: str, session_id: Optional[str] = None,
+                      run_id: Optional[str] = None) -> Run:
+        """
+        Async counterpart of `invoke`. LLM calls are awaited, so many sessions
+        can be served concurrently from one event loop.
+        
+        Args:
+            query: The user's query to process
+            session_id: Optional session identifier (uses "default" if None)
+            run_id: Optional run identifier, needed to `resume` a checkpointed run
+            
+        Returns:
+            The final run object after processing
+        """
+        session_id = session_id or "default"
+        initial_state = self._initial_state(query, session_id)
+
+        run_object = await self.workflow.arun(initial_state, run_id=run_id)
+
         # Store the complete run object in memory
         self.memory.add(run_object, session_id)
+
+        return run_object
+
+    def resume(self, run_id: str, session_id: Optional[str] = None) -> Run:
+        """
+        Continue a checkpointed run from its last completed step, e.g. after
+        the process died in the middle of a tool loop
+
+        A run that had already completed is rebuilt and returned, but not added
+        to the session again: it would roll the history back to that run.
         
+        Args:
+            run_id: Identifier of the interrupted run
+            session_id: Optional session to store the run in (uses "default" if None)
+            
+        Returns:
+            The final run object after processing
+        """
+        session_id = session_id or "default"
+        self.memory.create_session(session_id)
+
+        finished = self.workflow.is_finished(run_id)
+        run_object = self.workflow.resume(run_id)
+        if not finished:
+            self.memory.add(run_object, session_id)
+
         return run_object
 
-    def get_session_runs(self, session_id: Optional[str] = None) -> List[Run]:
+    def get_session_runs(self, session_id: Optional[str] = None) -> Sequence[Run]:
         """Get all Run objects for a session
         
         Args:
             session_id: Optional session ID (uses "default" if None)
             
         Returns:
-            List of Run objects in the session
+            Read-only sequence of the Run objects in the session
         """
         return self.memory.get_all_objects(session_id)
 
@@ -198,3 +385,5 @@ class Agent:
             session_id: Optional session to reset (uses "default" if None)
         """
         self.memory.reset(session_id)
+        if self.context_window is not None:
+            self.context_window.forget(session_id)
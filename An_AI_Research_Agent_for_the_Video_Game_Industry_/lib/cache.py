@@ -0,0 +1,204 @@
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from pydantic import BaseModel
+
+from lib.checkpoint import encode, decode
+
+
+def _jsonable(value: Any) -> Any:
+    """Fallback of json.dumps for the values of a completion request"""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, type) and issubclass(value, BaseModel):
+        # Structured output format: keyed by its name and JSON schema
+        return {"name": value.__name__, "schema": value.model_json_schema()}
+    return repr(value)
+
+
+class CompletionCache:
+    """
+    Content-addressed cache of chat completions.
+
+    Entries are keyed by a hash of everything that determines the completion
+    (model, temperature, messages, tools and response format). Recently used
+    entries are kept in an in-memory LRU; with a `path`, entries are also
+    stored in a SQLite database so they survive across processes, e.g. between
+    regression runs.
+
+    Only deterministic calls should be cached: `LLM` uses the cache when its
+    temperature is 0.
+
+    Example:
+        >>> cache = CompletionCache(path="completions.db", ttl=24 * 3600)
+        >>> llm = LLM(temperature=0.0, cache=cache)
+        >>> llm.invoke("What is the best selling game?")
+        >>> cache.stats()
+        {'hits': 0, 'misses': 1, 'hit_rate': 0.0, ...}
+    """
+
+    def __init__(self,
+                 max_entries: int = 1024,
+                 ttl: Optional[float] = None,
+                 path: Optional[str] = None,
+                 max_disk_entries: int = 100_000):
+        """
+        Args:
+            max_entries: Maximum number of entries kept in memory
+            ttl: Optional lifetime of an entry in seconds
+            path: Optional SQLite database storing the entries on disk
+            max_disk_entries: Maximum number of entries kept on disk. The least
+                recently used entries are evicted first.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+
+        self._conn = None
+        self._disk_entries = 0
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed)"
+            )
+            self._conn.commit()
+            self._disk_entries = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+    def __repr__(self) -> str:
+        return f"CompletionCache(entries={len(self._memory)}, path={self.path!r})"
+
+    @staticmethod
+    def make_key(model: str,
+                 temperature: float,
+                 messages: List[Any],
+                 tools: Optional[List[Dict]] = None,
+                 response_format: Any = None) -> str:
+        """Hash the parameters of a completion request"""
+        request = {
+            "model": model,
+            "temperature": temperature,
+            "messages": messages,
+            "tools": tools,
+            "response_format": response_format,
+        }
+        canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), default=_jsonable)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a cached completion, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, value = entry
+                if not self._expired(created, now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT value, created FROM completions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    payload, created = row
+                    with self._conn:
+                        if self._expired(created, now):
+                            self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                            self._disk_entries -= 1
+                        else:
+                            self._conn.execute(
+                                "UPDATE completions SET accessed = ? WHERE key = ?", (now, key)
+                            )
+                            value = decode(json.loads(payload))
+                            self._remember(key, created, value)
+                            self.hits += 1
+                            return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Any):
+        """Store a completion. Values must be serializable by `lib.checkpoint.encode`."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            if self._conn is None:
+                return
+
+            payload = json.dumps(encode(value))
+            with self._conn:
+                cursor = self._conn.execute(
+                    "UPDATE completions SET value = ?, created = ?, accessed = ? WHERE key = ?",
+                    (payload, now, now, key)
+                )
+                if cursor.rowcount == 0:
+                    self._conn.execute(
+                        "INSERT INTO completions VALUES (?, ?, ?, ?)", (key, payload, now, now)
+                    )
+                    self._disk_entries += 1
+                if self._disk_entries > self.max_disk_entries:
+                    self._evict_disk()
+
+    def _remember(self, key: str, created: float, value: Any):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        """Delete the least recently used entries on disk, leaving 10% headroom
+        so eviction doesn't run on every put"""
+        keep = int(self.max_disk_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM completions WHERE key IN ("
+            "SELECT key FROM completions ORDER BY accessed DESC LIMIT -1 OFFSET ?)", (keep,)
+        )
+        self._disk_entries = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the hit and miss counters of the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.hits - self.memory_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_entries,
+            }
+
+    def clear(self):
+        """Remove every entry and reset the counters"""
+        with self._lock:
+            self._memory.clear()
+            self.hits = self.memory_hits = self.misses = 0
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM completions")
+                self._disk_entries = 0
@@ -0,0 +1,303 @@
+from typing import Any, Dict, List, Optional, Tuple
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, asdict
+from datetime import datetime
+import base64
+import importlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+
+from pydantic import BaseModel
+
+
+# Key marking values that are not plain JSON (pydantic models, datetimes, ...)
+TYPE_KEY = "__type__"
+
+
+def _qualified_name(cls: type) -> str:
+    return f"{cls.__module__}:{cls.__qualname__}"
+
+
+def _import_qualified_name(name: str) -> type:
+    module_name, _, qualname = name.partition(":")
+    obj = importlib.import_module(module_name)
+    for attr in qualname.split("."):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def encode(value: Any) -> Any:
+    """
+    Convert a state value into JSON-compatible data.
+
+    Pydantic models (messages, ToolCalls, ...) are stored as their JSON dump plus
+    their class path, so they round-trip without pickling. Values the serializer
+    doesn't know are pickled as a last resort.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, BaseModel):
+        return {
+            TYPE_KEY: "model",
+            "cls": _qualified_name(type(value)),
+            "data": value.model_dump(mode="json"),
+        }
+    if isinstance(value, list):
+        return [encode(v) for v in value]
+    if isinstance(value, tuple):
+        return {TYPE_KEY: "tuple", "items": [encode(v) for v in value]}
+    if isinstance(value, dict):
+        if TYPE_KEY not in value and all(isinstance(k, str) for k in value):
+            return {k: encode(v) for k, v in value.items()}
+        return {TYPE_KEY: "dict", "items": [[encode(k), encode(v)] for k, v in value.items()]}
+    if isinstance(value, datetime):
+        return {TYPE_KEY: "datetime", "value": value.isoformat()}
+    return {TYPE_KEY: "pickle", "data": base64.b64encode(pickle.dumps(value)).decode("ascii")}
+
+
+def decode(data: Any) -> Any:
+    """Inverse of `encode`"""
+    if isinstance(data, list):
+        return [decode(v) for v in data]
+    if not isinstance(data, dict):
+        return data
+
+    kind = data.get(TYPE_KEY)
+    if kind is None:
+        return {k: decode(v) for k, v in data.items()}
+    if kind == "model":
+        return _import_qualified_name(data["cls"]).model_validate(data["data"])
+    if kind == "tuple":
+        return tuple(decode(v) for v in data["items"])
+    if kind == "dict":
+        return {decode(k): decode(v) for k, v in data["items"]}
+    if kind == "datetime":
+        return datetime.fromisoformat(data["value"])
+    if kind == "pickle":
+        return pickle.loads(base64.b64decode(data["data"]))
+    raise ValueError(f"Unknown serialized type: {kind}")
+
+
+def encode_delta(delta: Dict[str, Any], previous_state: Dict[str, Any]) -> str:
+    """
+    Serialize the fields changed by a step.
+
+    A list that extends the previous value of its field (e.g. `messages` with a new
+    message appended) is stored as the appended items only, so long conversations
+    are not written again on every step.
+    """
+    fields = {}
+    for name, value in delta.items():
+        previous = previous_state.get(name)
+        if (isinstance(value, list) and isinstance(previous, list)
+                and 0 < len(previous) <= len(value)
+                and all(a is b for a, b in zip(previous, value))):
+            fields[name] = {TYPE_KEY: "extend", "items": encode(value[len(previous):])}
+        else:
+            fields[name] = encode(value)
+    return json.dumps(fields, separators=(",", ":"))
+
+
+def apply_delta(state: Dict[str, Any], payload: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Apply a delta serialized by `encode_delta` to a state.
+
+    Returns:
+        Tuple of (new state, decoded delta)
+    """
+    delta = {}
+    for name, value in json.loads(payload).items():
+        if isinstance(value, dict) and value.get(TYPE_KEY) == "extend":
+            delta[name] = state[name] + decode(value["items"])
+        else:
+            delta[name] = decode(value)
+    return {**state, **delta}, delta
+
+
+@dataclass
+class Checkpoint:
+    """A persisted snapshot of a run.
+
+    `next_step_ids` is only set on the last checkpoint of each executed batch of
+    steps; it is where a resumed run continues from.
+    """
+    run_id: str
+    seq: int
+    snapshot_id: str
+    step_id: str
+    timestamp: datetime
+    delta: str
+    next_step_ids: Optional[List[str]] = None
+
+
+class Checkpointer(ABC):
+    """Persists StateMachine snapshots incrementally so runs can be resumed"""
+
+    @abstractmethod
+    def put(self, checkpoints: List[Checkpoint]):
+        """Persist the checkpoints of one batch of executed steps"""
+        pass
+
+    @abstractmethod
+    def get(self, run_id: str) -> List[Checkpoint]:
+        """Get every checkpoint of a run, ordered by seq"""
+        pass
+
+    @abstractmethod
+    def list_runs(self) -> List[str]:
+        """Get the ids of all checkpointed runs"""
+        pass
+
+    def restore(self, run_id: str) -> Tuple[List[Tuple[Checkpoint, Dict, Dict]], List[str]]:
+        """
+        Rebuild the states of a checkpointed run.
+
+        Returns:
+            Tuple of ([(checkpoint, state, delta), ...], ids of the steps to run next)
+
+        Raises:
+            ValueError: If the run has no complete checkpoint
+        """
+        checkpoints = self.get(run_id)
+        # Ignore a trailing batch that was interrupted while being written
+        last = max((i for i, c in enumerate(checkpoints) if c.next_step_ids is not None), default=None)
+        if last is None:
+            raise ValueError(f"No checkpoint found for run '{run_id}'")
+
+        restored = []
+        state: Dict[str, Any] = {}
+        for checkpoint in checkpoints[:last + 1]:
+            state, delta = apply_delta(state, checkpoint.delta)
+            restored.append((checkpoint, state, delta))
+        return restored, checkpoints[last].next_step_ids
+
+
+class SQLiteCheckpointer(Checkpointer):
+    """Stores checkpoints in a SQLite database, one row per snapshot"""
+
+    def __init__(self, path: str = "checkpoints.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "run_id TEXT NOT NULL, seq INTEGER NOT NULL, snapshot_id TEXT NOT NULL, "
+            "step_id TEXT NOT NULL, timestamp TEXT NOT NULL, delta TEXT NOT NULL, "
+            "next_step_ids TEXT, PRIMARY KEY (run_id, seq))"
+        )
+        self._conn.commit()
+
+    def __repr__(self) -> str:
+        return f"SQLiteCheckpointer('{self.path}')"
+
+    def put(self, checkpoints: List[Checkpoint]):
+        rows = [
+            (c.run_id, c.seq, c.snapshot_id, c.step_id, c.timestamp.isoformat(), c.delta,
+             json.dumps(c.next_step_ids) if c.next_step_ids is not None else None)
+            for c in checkpoints
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def get(self, run_id: str) -> List[Checkpoint]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT run_id, seq, snapshot_id, step_id, timestamp, delta, next_step_ids "
+                "FROM checkpoints WHERE run_id = ? ORDER BY seq", (run_id,)
+            ).fetchall()
+        return [
+            Checkpoint(
+                run_id=row[0], seq=row[1], snapshot_id=row[2], step_id=row[3],
+                timestamp=datetime.fromisoformat(row[4]), delta=row[5],
+                next_step_ids=json.loads(row[6]) if row[6] is not None else None,
+            )
+            for row in rows
+        ]
+
+    def list_runs(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT run_id FROM checkpoints").fetchall()
+        return [row[0] for row in rows]
+
+
+class FileSystemCheckpointer(Checkpointer):
+    """Stores checkpoints as JSON lines, one `<run_id>.jsonl` file per run"""
+
+    def __init__(self, directory: str = "checkpoints"):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def __repr__(self) -> str:
+        return f"FileSystemCheckpointer('{self.directory}')"
+
+    def _path(self, run_id: str) -> str:
+        return os.path.join(self.directory, f"{run_id}.jsonl")
+
+    def put(self, checkpoints: List[Checkpoint]):
+        if not checkpoints:
+            return
+        lines = "".join(
+            json.dumps({**asdict(c), "timestamp": c.timestamp.isoformat()}, separators=(",", ":")) + "\n"
+            for c in checkpoints
+        )
+        path = self._path(checkpoints[0].run_id)
+        with self._lock:
+            self._drop_partial_line(path)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+
+    @staticmethod
+    def _drop_partial_line(path: str):
+        """Truncate a line left unterminated by an interrupted write, which the next
+        line would otherwise be glued onto"""
+        if not os.path.exists(path):
+            return
+        with open(path, "r+b") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            end = size
+            while end > 0:
+                start = max(end - 4096, 0)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b"\n")
+                if newline != -1:
+                    end = start + newline + 1
+                    break
+                end = start
+            f.truncate(end)
+
+    def get(self, run_id: str) -> List[Checkpoint]:
+        path = self._path(run_id)
+        if not os.path.exists(path):
+            return []
+
+        # A resumed run rewrites the seqs of an interrupted batch, the latest line wins
+        checkpoints: Dict[int, Checkpoint] = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Partially written line
+                data["timestamp"] = datetime.fromisoformat(data["timestamp"])
+                checkpoints[data["seq"]] = Checkpoint(**data)
+        return [checkpoints[seq] for seq in sorted(checkpoints)]
+
+    def list_runs(self) -> List[str]:
+        return [
+            name[:-len(".jsonl")] for name in os.listdir(self.directory)
+            if name.endswith(".jsonl")
+        ]
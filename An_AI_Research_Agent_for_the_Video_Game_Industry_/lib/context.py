@@ -0,0 +1,278 @@
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+import importlib.util
+import threading
+
+from lib.logs import get_logger
+from lib.messages import AIMessage, AnyMessage, SystemMessage, ToolMessage, UserMessage
+
+if TYPE_CHECKING:
+    from lib.llm import LLM
+
+
+logger = get_logger(__name__)
+
+# Tokens added by the chat format to every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Start of the system message holding the summary of the dropped turns
+SUMMARY_PREFIX = "Summary of the earlier conversation:"
+
+# Appended to the tool outputs cut by a context window
+TRUNCATION_MARKER = " [truncated]"
+
+SUMMARY_INSTRUCTIONS = (
+    "Summarize the conversation below for an assistant that will continue it. "
+    "Keep the facts, decisions, user preferences and open questions. Be concise."
+)
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str) -> Any:
+    """Get the tiktoken encoding of a model, or None when tiktoken is not available"""
+    if importlib.util.find_spec("tiktoken") is None:
+        return None
+    import tiktoken
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # Encodings are downloaded on first use, which fails offline
+        logger.warning("[Context] tiktoken encoding unavailable, estimating tokens: %s", e)
+        return None
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """
+    Count the tokens of a text with the local tiktoken tokenizer of the model.
+
+    Without tiktoken, tokens are estimated as one per 4 characters. Counts are
+    cached by text, so the unchanged history of a session is counted once.
+    """
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str = "gpt-4o-mini") -> str:
+    """Cut a text to its first `max_tokens` tokens"""
+    encoding = _encoding(model)
+    if encoding is None:
+        return text[:max_tokens * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def count_message_tokens(message: AnyMessage, model: str = "gpt-4o-mini") -> int:
+    """Count the tokens of a chat message, including its tool calls"""
+    tokens = MESSAGE_OVERHEAD_TOKENS + count_tokens(message.content or "", model)
+    if isinstance(message, AIMessage) and message.tool_calls:
+        for call in message.tool_calls:
+            tokens += count_tokens(call.function.name, model) + count_tokens(call.function.arguments, model)
+    return tokens
+
+
+def is_summary(message: AnyMessage) -> bool:
+    return isinstance(message, SystemMessage) and (message.content or "").startswith(SUMMARY_PREFIX)
+
+
+@dataclass
+class FittedContext:
+    """Messages fitted in a context window"""
+    messages: List[AnyMessage]
+    tokens: int
+    dropped: int = 0
+
+
+class ContextWindow:
+    """
+    Keeps the conversation of an agent under a token budget.
+
+    On every LLM call:
+    - The system messages and the last `keep_last_turns` turns are pinned. A
+      turn starts at a user message and includes the tool calls it caused.
+    - Tool outputs of older turns are cut to `max_tool_output_tokens`.
+    - If the conversation is still over `max_tokens`, the oldest turns are
+      dropped, whole so that tool calls stay paired with their results.
+
+    With a `summarizer` LLM, dropped turns are summarized and the summary is
+    kept as a system message after the instructions. Summaries are computed
+    in a background thread by default: they are included from the next LLM
+    call on, so a turn never waits for one.
+
+    Tokens are counted with tiktoken when it is installed, otherwise estimated
+    from the length of the text.
+
+    Example:
+        >>> window = ContextWindow(max_tokens=4000, summarizer=LLM(temperature=0.0))
+        >>> agent = Agent("gpt-4o-mini", "You are helpful", context_window=window)
+        >>> agent.invoke("Hi").get_final_state()["context_tokens"]
+        27
+    """
+
+    def __init__(self,
+                 max_tokens: Optional[int] = None,
+                 keep_last_turns: int = 4,
+                 max_tool_output_tokens: Optional[int] = None,
+                 summarizer: Optional["LLM"] = None,
+                 background: bool = True,
+                 model: str = "gpt-4o-mini"):
+        """
+        Args:
+            max_tokens: Optional token budget of the conversation (default: unlimited,
+                tokens are only counted)
+            keep_last_turns: Number of most recent turns never trimmed or dropped
+            max_tool_output_tokens: Optional maximum tokens of the tool outputs of older turns
+            summarizer: Optional LLM summarizing the dropped turns
+            background: Summarize in a background thread rather than during the turn
+            model: Model whose tokenizer counts the tokens
+        """
+        if keep_last_turns < 1:
+            raise ValueError("ContextWindow must keep at least one turn")
+
+        self.max_tokens = max_tokens
+        self.keep_last_turns = keep_last_turns
+        self.max_tool_output_tokens = max_tool_output_tokens
+        self.summarizer = summarizer
+        self.background = background
+        self.model = model
+
+        # Latest summary of each session, written by the summarizer thread
+        self._summaries: Dict[str, str] = {}
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def __repr__(self) -> str:
+        return f"ContextWindow(max_tokens={self.max_tokens}, keep_last_turns={self.keep_last_turns})"
+
+    @property
+    def has_budget(self) -> bool:
+        """Whether the window trims the conversation, rather than only counting its tokens"""
+        return self.max_tokens is not None or self.max_tool_output_tokens is not None
+
+    def count(self, messages: List[AnyMessage]) -> int:
+        """Count the tokens of a list of messages"""
+        return sum(count_message_tokens(m, self.model) for m in messages)
+
+    def fit(self, messages: List[AnyMessage], session_id: str = "default") -> FittedContext:
+        """
+        Fit a conversation in the window.
+
+        Args:
+            messages: The conversation, starting with the system messages
+            session_id: Session of the conversation, whose summary is used
+
+        Returns:
+            The fitted messages and their token count. The input list is not modified.
+        """
+        if not self.has_budget:
+            return FittedContext(messages, self.count(messages))
+
+        n_system = 0
+        while n_system < len(messages) and isinstance(messages[n_system], SystemMessage):
+            n_system += 1
+        system = [m for m in messages[:n_system] if not is_summary(m)]
+        summary_message = next((m for m in messages[:n_system] if is_summary(m)), None)
+        summary = summary_message.content[len(SUMMARY_PREFIX):].strip() if summary_message else None
+        with self._lock:
+            if self._summaries.get(session_id, summary) != summary:
+                summary = self._summaries[session_id]
+                summary_message = SystemMessage(content=f"{SUMMARY_PREFIX} {summary}")
+
+        turns: List[List[AnyMessage]] = []
+        for message in messages[n_system:]:
+            if isinstance(message, UserMessage) or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        old, recent = turns[:-self.keep_last_turns], turns[-self.keep_last_turns:]
+
+        if self.max_tool_output_tokens is not None:
+            old = [[self._trim_tool_output(m) for m in turn] for turn in old]
+
+        def assemble() -> List[AnyMessage]:
+            head = system + ([summary_message] if summary_message else [])
+            return head + [m for turn in old + recent for m in turn]
+
+        fitted = assemble()
+        tokens = self.count(fitted)
+        dropped: List[AnyMessage] = []
+        if self.max_tokens is not None:
+            while old and tokens > self.max_tokens:
+                turn = old.pop(0)
+                dropped += turn
+                tokens -= sum(count_message_tokens(m, self.model) for m in turn)
+            if dropped:
+                fitted = assemble()
+                tokens = self.count(fitted)
+                if self.summarizer is not None:
+                    self._summarize(session_id, summary, dropped)
+
+        if self.max_tokens is not None and tokens > self.max_tokens:
+            logger.warning("[Context] %d tokens over the budget of %d after dropping every unpinned turn",
+                           tokens - self.max_tokens, self.max_tokens)
+        if len(fitted) == len(messages) and all(a is b for a, b in zip(fitted, messages)):
+            # Unchanged: keep the list, so the state and the request prefix are reused
+            fitted = messages
+        return FittedContext(fitted, tokens, len(dropped))
+
+    def _trim_tool_output(self, message: AnyMessage) -> AnyMessage:
+        if not isinstance(message, ToolMessage) or message.content.endswith(TRUNCATION_MARKER):
+            return message
+        if count_tokens(message.content, self.model) <= self.max_tool_output_tokens:
+            return message
+        content = truncate_tokens(message.content, self.max_tool_output_tokens, self.model)
+        return message.model_copy(update={"content": content + TRUNCATION_MARKER})
+
+    def _summarize(self, session_id: str, summary: Optional[str], dropped: List[AnyMessage]):
+        transcript = "\n".join(
+            f"{m.role}: {m.content}" for m in dropped if m.content
+        )
+
+        def run():
+            with self._lock:
+                # Build on the latest summary, possibly written by an earlier job
+                previous = self._summaries.get(session_id, summary)
+            text = transcript if previous is None else f"{SUMMARY_PREFIX} {previous}\n{transcript}"
+            try:
+                response = self.summarizer.invoke([
+                    SystemMessage(content=SUMMARY_INSTRUCTIONS),
+                    UserMessage(content=text),
+                ])
+            except Exception:
+                logger.exception("[Context] Summarizing session %s failed", session_id)
+                return
+            with self._lock:
+                self._summaries[session_id] = response.content
+            logger.debug("[Context] Summarized %d messages of session %s", len(dropped), session_id)
+
+        if not self.background:
+            run()
+            return
+        with self._lock:
+            if self._executor is None:
+                # One worker: jobs of a session run in order, each building on the previous summary
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="context-summary")
+            self._pending[session_id] = self._executor.submit(run)
+
+    def wait(self, session_id: Optional[str] = None):
+        """Wait for the pending summaries of a session, or of every session"""
+        with self._lock:
+            futures = list(self._pending.values()) if session_id is None else [self._pending.get(session_id)]
+        for future in futures:
+            if future is not None:
+                future.result()
+
+    def forget(self, session_id: Optional[str] = None):
+        """Drop the summary of a session, or of every session, e.g. when it is reset"""
+        self.wait(session_id)
+        with self._lock:
+            if session_id is None:
+                self._summaries.clear()
+            else:
+                self._summaries.pop(session_id, None)
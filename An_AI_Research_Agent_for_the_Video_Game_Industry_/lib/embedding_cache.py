@@ -0,0 +1,254 @@
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+from contextlib import contextmanager
+import hashlib
+import os
+import re
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+from chromadb.api.types import Documents, Embeddings
+from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
+
+
+EmbedFunction = Callable[[List[str]], Sequence[Sequence[float]]]
+
+_DIGEST = re.compile(r"[0-9a-f]{64}")
+
+
+@contextmanager
+def _exclusive_lock(path: str) -> Iterator[None]:
+    """Hold an exclusive lock on a file, across every process and cache instance"""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)  # Released when the file is closed
+            yield
+            return
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class _ModelStore:
+    """
+    Embeddings of one model: a float32 matrix file, memory-mapped for reads,
+    and an index file listing the sha256 of the text of each row.
+
+    Both files are append-only. A row is written before its index line, so an
+    interrupted write leaves at most a partial row and a partial index line.
+    Both are removed before anything is appended: otherwise the next index line
+    would be glued onto the partial one and shift every later row.
+
+    Several processes or cache instances can share the files: appends hold an
+    exclusive lock on a `.lock` file, first read the index lines appended by the
+    others, then write at the row count of the vectors file.
+    """
+
+    def __init__(self, directory: str, model: str):
+        name = re.sub(r"[^A-Za-z0-9._-]", "_", model)
+        self.vectors_path = os.path.join(directory, f"{name}.f32")
+        self.index_path = os.path.join(directory, f"{name}.idx")
+        self.lock_path = os.path.join(directory, f"{name}.lock")
+        self.rows: Dict[str, int] = {}
+        self.dim: Optional[int] = None
+        # Rows of the vectors file and bytes of the index file read so far
+        self.count = 0
+        self._index_size = 0
+        self._matrix: Optional[np.memmap] = None
+
+        with _exclusive_lock(self.lock_path):
+            self._recover()
+
+    def _recover(self):
+        """Read the whole index, keeping only the complete lines and the rows they list,
+        and rewrite the files if a write was interrupted. Requires the lock."""
+        content = ""
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding="ascii") as f:
+                content = f.read()
+        lines = content.split("\n")[:-1]  # The last element is "" or a partial line
+        self.dim = int(lines[0]) if lines and lines[0].isdigit() and int(lines[0]) > 0 else None
+        hashes = []
+        if self.dim is not None:
+            for line in lines[1:]:
+                if not _DIGEST.fullmatch(line):
+                    break
+                hashes.append(line)
+            size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+            hashes = hashes[:size // (self.dim * 4)]
+        self.rows = {digest: row for row, digest in enumerate(hashes)}
+        self.count = len(hashes)
+
+        complete = "" if self.dim is None else f"{self.dim}\n" + "".join(f"{d}\n" for d in hashes)
+        if content != complete:
+            with open(f"{self.index_path}.tmp", "w", encoding="ascii") as f:
+                f.write(complete)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(f"{self.index_path}.tmp", self.index_path)
+        self._index_size = len(complete)
+        if os.path.exists(self.vectors_path):
+            size = self.count * self.dim * 4 if self.dim is not None else 0
+            if os.path.getsize(self.vectors_path) != size:
+                with open(self.vectors_path, "r+b") as f:
+                    f.truncate(size)
+
+    def _sync(self):
+        """Read the rows appended by other writers since the last read. Requires the lock."""
+        index_size = os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+        vectors_size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        if index_size > self._index_size and self.dim is not None:
+            with open(self.index_path, "rb") as f:
+                f.seek(self._index_size)
+                tail = f.read(index_size - self._index_size).decode("ascii", errors="replace")
+            lines = tail.split("\n")
+            if lines[-1] == "" and all(_DIGEST.fullmatch(line) for line in lines[:-1]):
+                for digest in lines[:-1]:
+                    self.rows[digest] = self.count
+                    self.count += 1
+                self._index_size = index_size
+        expected = self.count * self.dim * 4 if self.dim is not None else 0
+        if index_size != self._index_size or vectors_size != expected:
+            # Rewritten, or left torn by a writer that crashed: read it again and repair it
+            self._recover()
+
+    def matrix(self) -> np.memmap:
+        if self._matrix is None or len(self._matrix) != self.count:
+            self._matrix = np.memmap(
+                self.vectors_path, dtype=np.float32, mode="r", shape=(self.count, self.dim)
+            )
+        return self._matrix
+
+    def append(self, digests: List[str], vectors: np.ndarray):
+        """Append the rows of digests, skipping the ones another writer already added"""
+        with _exclusive_lock(self.lock_path):
+            self._sync()
+            new = {}
+            for digest, vector in zip(digests, vectors):
+                if digest not in self.rows:
+                    new.setdefault(digest, vector)
+            if not new:
+                return
+            vectors = np.stack(list(new.values()))
+
+            header = ""
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                header = f"{self.dim}\n"
+                open(self.vectors_path, "wb").close()  # Drop rows left without an index
+                open(self.index_path, "w").close()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected embeddings of dimension {self.dim}, got {vectors.shape[1]}")
+
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            lines = header + "".join(f"{digest}\n" for digest in new)
+            with open(self.index_path, "a", encoding="ascii") as f:
+                f.write(lines)
+
+            for digest in new:
+                self.rows[digest] = self.count
+                self.count += 1
+            self._index_size += len(lines)
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of text embeddings, keyed by (model, sha256(text)).
+
+    Each model has a float32 matrix file, memory-mapped so cached embeddings are
+    read without loading the whole cache, and an index of the text hashes of its
+    rows. Repeated texts are embedded once, across runs and call sites.
+
+    Example:
+        >>> cache = EmbeddingCache("embedding_cache")
+        >>> vectors = cache.embed(texts, embed_fn, model="text-embedding-3-small")
+    """
+
+    def __init__(self, directory: str = "embedding_cache"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._stores: Dict[str, _ModelStore] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self) -> str:
+        return f"EmbeddingCache('{self.directory}')"
+
+    def _store(self, model: str) -> _ModelStore:
+        if model not in self._stores:
+            self._stores[model] = _ModelStore(self.directory, model)
+        return self._stores[model]
+
+    @staticmethod
+    def _digest(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def embed(self, texts: List[str], embed_fn: EmbedFunction, model: str) -> np.ndarray:
+        """
+        Get the embeddings of texts, computing only the ones not cached.
+
+        Args:
+            texts: Texts to embed
+            embed_fn: Function embedding a list of texts, called once with the
+                distinct texts missing from the cache
+            model: Name of the embedding model, part of the cache key
+
+        Returns:
+            float32 array of shape (len(texts), dimension)
+        """
+        digests = [self._digest(text) for text in texts]
+        with self._lock:
+            store = self._store(model)
+            missing = {d: t for d, t in zip(digests, texts) if d not in store.rows}
+            self.hits += len(texts) - sum(1 for d in digests if d in missing)
+            self.misses += len(missing)
+
+        if missing:
+            vectors = np.asarray(embed_fn(list(missing.values())), dtype=np.float32)
+            with self._lock:
+                store.append(list(missing), vectors)
+
+        with self._lock:
+            if not texts:
+                return np.zeros((0, store.dim or 0), dtype=np.float32)
+            matrix = store.matrix()
+            return np.array(matrix[[store.rows[d] for d in digests]])
+
+    def stats(self) -> Dict[str, int]:
+        """Get the hit and miss counters of the cache"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": sum(len(store.rows) for store in self._stores.values()),
+            }
+
+
+class CachedOpenAIEmbeddingFunction(OpenAIEmbeddingFunction):
+    """OpenAI embedding function of Chroma, embedding each distinct text only once"""
+
+    def __init__(self, cache: EmbeddingCache, **kwargs):
+        """
+        Args:
+            cache: The embedding cache
+            **kwargs: Arguments of OpenAIEmbeddingFunction (api_key, model_name, ...)
+        """
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    def __call__(self, input: Documents) -> Embeddings:
+        vectors = self.cache.embed(list(input), super().__call__, self.model_name)
+        return list(vectors)
@@ -2,11 +2,17 @@ import json
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel, Field
 
-from lib.agents import AgentState
+from lib.agents import AgentState, CONTEXT_STEP_ID
 from lib.state_machine import Run
 from lib.llm import LLM
+from lib.cache import CompletionCache
 from lib.messages import AIMessage, BaseMessage
 from lib.parsers import PydanticOutputParser
+from lib.instrumentation import StepProfiler
+from lib.logs import get_logger
+
+
+logger = get_logger(__name__)
 
 
 class TaskCompletionMetrics(BaseModel):
@@ -64,8 +70,13 @@ class JudgeEvaluation(BaseModel):
 class AgentEvaluator:
     """Comprehensive agent evaluation framework"""
     
-    def __init__(self):
-        self.llm_judge = LLM(model="gpt-4o-mini")
+    def __init__(self, cache: Optional[CompletionCache] = None):
+        """
+        Args:
+            cache: Optional completion cache for the judge, so unchanged
+                responses are not judged again across regression runs
+        """
+        self.llm_judge = LLM(model="gpt-4o-mini", temperature=0.0, cache=cache)
     
     def evaluate_final_response(self, 
                           test_case: TestCase, 
@@ -103,8 +114,8 @@ class AgentEvaluator:
         try:
             evaluation = parser.parse(judge_response)
         except Exception as e:
-            print(f"Debug: Structured parsing error: {e}")
-            print(f"Debug: Judge response content: {judge_response.content}")
+            logger.debug("Structured parsing error: %s", e)
+            logger.debug("Judge response content: %s", judge_response.content)
             
             # Fallback evaluation based on simple heuristics
             has_game_info = any(keyword in agent_response.lower() 
@@ -238,9 +249,14 @@ class AgentEvaluator:
     
     def evaluate_trajectory(self, 
                           test_case: TestCase,
-                          run: Run) -> EvaluationResult:
+                          run: Run,
+                          profiler: Optional[StepProfiler] = None) -> EvaluationResult:
         """
         Evaluate the entire trajectory/path taken by the agent
+
+        If the profiler registered on the agent workflow is given, tool call latency
+        is measured from the tool execution steps instead of estimated from the
+        total execution time.
         """
         if not run.snapshots:
             return self._create_failed_evaluation("No execution snapshots found")
@@ -249,10 +265,10 @@ class AgentEvaluator:
         if not final_state:
             return self._create_failed_evaluation("No final state found")
         
-        # Analyze the trajectory
+        # Analyze the trajectory. Fitting the context window is bookkeeping, not a step of the agent.
         actual_steps = [
-            snapshot for snapshot in run.snapshots 
-            if snapshot.step_id not in ["__entry__", "__termination__"]
+            step_id for step_id in run.trajectory
+            if step_id not in ["__entry__", "__termination__", CONTEXT_STEP_ID]
         ]
         steps_taken = len(actual_steps)
         messages = final_state.get("messages", [])
@@ -296,10 +312,17 @@ class AgentEvaluator:
         if run.end_timestamp and run.start_timestamp:
             execution_time = (run.end_timestamp - run.start_timestamp).total_seconds()
         
+        tool_time = execution_time
+        if profiler:
+            tool_time = sum(
+                record.wall_time for record in profiler.records_for(run.run_id)
+                if record.step_id == "tool_executor"
+            )
+
         system_metrics = SystemMetrics(
             total_tokens=total_tokens,
             execution_time=execution_time,
-            tool_call_latency=execution_time / max(len(tool_calls_made), 1),
+            tool_call_latency=tool_time / max(len(tool_calls_made), 1),
             cost_estimate=self._estimate_cost(total_tokens)
         )
         
@@ -0,0 +1,188 @@
+from typing import Any, Dict, List, Optional, Tuple
+from dataclasses import dataclass, asdict
+import hashlib
+import json
+import threading
+import time
+import tracemalloc
+import uuid
+
+from lib.state_machine import StepHook, Run, Step
+from lib.messages import AIMessage
+
+
+@dataclass
+class StepRecord:
+    """Timing and usage measured for one step execution"""
+    run_id: str
+    step_id: str
+    span_id: str
+    start_time_ns: int
+    end_time_ns: int
+    wall_time: float
+    cpu_time: float
+    allocated_bytes: Optional[int] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    error: Optional[str] = None
+
+
+class StepProfiler(StepHook):
+    """
+    Records wall time, CPU time, allocated memory and LLM token usage of every step.
+
+    Register it with `StateMachine.add_hook`. Records can be exported as JSON lines
+    (`to_jsonl`) or as OpenTelemetry spans (`to_otel_spans`), one trace per run.
+
+    CPU time is the time of the thread running the step. Allocated bytes are the
+    growth of memory traced by tracemalloc during the step, which is process-wide
+    and therefore approximate when steps run concurrently.
+
+    Example:
+        >>> profiler = StepProfiler()
+        >>> agent.workflow.add_hook(profiler)
+        >>> run = agent.invoke("What is the best selling game?")
+        >>> profiler.to_jsonl("trace.jsonl")
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        """
+        Args:
+            trace_memory: Measure allocated bytes per step. Starts tracemalloc,
+                which slows down every allocation in the process.
+        """
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.records: List[StepRecord] = []
+        self._started: Dict[Tuple[str, str, int], Tuple[int, float, float, Optional[int]]] = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"StepProfiler(records={len(self.records)})"
+
+    def _key(self, run: Run, step: Step) -> Tuple[str, str, int]:
+        return (run.run_id, step.step_id, threading.get_ident())
+
+    def before_step(self, run: Run, step: Step, state: Dict):
+        allocated = tracemalloc.get_traced_memory()[0] if self.trace_memory else None
+        started = (time.time_ns(), time.perf_counter(), time.thread_time(), allocated)
+        with self._lock:
+            self._started[self._key(run, step)] = started
+
+    def after_step(self, run: Run, step: Step, state: Dict, update: Dict,
+                   error: Optional[Exception] = None):
+        wall_end, cpu_end = time.perf_counter(), time.thread_time()
+        allocated_end = tracemalloc.get_traced_memory()[0] if self.trace_memory else None
+        with self._lock:
+            start_ns, wall_start, cpu_start, allocated_start = self._started.pop(self._key(run, step))
+
+        wall_time = wall_end - wall_start
+        prompt_tokens, completion_tokens, total_tokens = self._token_usage(state, update)
+        record = StepRecord(
+            run_id=run.run_id,
+            step_id=step.step_id,
+            span_id=uuid.uuid4().hex[:16],
+            start_time_ns=start_ns,
+            end_time_ns=start_ns + int(wall_time * 1e9),
+            wall_time=wall_time,
+            cpu_time=cpu_end - cpu_start,
+            allocated_bytes=allocated_end - allocated_start if self.trace_memory else None,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=total_tokens,
+            error=repr(error) if error else None,
+        )
+        with self._lock:
+            self.records.append(record)
+
+    def _token_usage(self, state: Dict, update: Dict) -> Tuple[int, int, int]:
+        """Sum the usage of AI messages added by the step, falling back to the
+        change of the `prompt_tokens`, `completion_tokens` and `total_tokens`
+        state fields, e.g. of an agent"""
+        prompt_tokens = completion_tokens = total_tokens = 0
+        previous_count = len(state.get("messages") or [])
+        for message in (update.get("messages") or [])[previous_count:]:
+            if isinstance(message, AIMessage) and message.token_usage:
+                prompt_tokens += message.token_usage.prompt_tokens
+                completion_tokens += message.token_usage.completion_tokens
+                total_tokens += message.token_usage.total_tokens
+
+        if not total_tokens:
+            def change(name: str) -> int:
+                return update[name] - (state.get(name) or 0) if name in update else 0
+
+            prompt_tokens = change("prompt_tokens")
+            completion_tokens = change("completion_tokens")
+            total_tokens = change("total_tokens")
+        return prompt_tokens, completion_tokens, total_tokens
+
+    def records_for(self, run_id: str) -> List[StepRecord]:
+        """Get the records of a single run"""
+        with self._lock:
+            return [r for r in self.records if r.run_id == run_id]
+
+    def reset(self):
+        with self._lock:
+            self.records = []
+
+    def to_jsonl(self, path: str):
+        """Append every record to a JSON-lines trace file"""
+        with self._lock:
+            records = list(self.records)
+        with open(path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(asdict(record)) + "\n")
+
+    def to_otel_spans(self) -> List[Dict[str, Any]]:
+        """
+        Export the records as spans following the OpenTelemetry (OTLP/JSON) span
+        layout, using the run id as trace id.
+        """
+        with self._lock:
+            records = list(self.records)
+
+        spans = []
+        for record in records:
+            attributes = {
+                "step.wall_time": record.wall_time,
+                "step.cpu_time": record.cpu_time,
+                "llm.usage.prompt_tokens": record.prompt_tokens,
+                "llm.usage.completion_tokens": record.completion_tokens,
+                "llm.usage.total_tokens": record.total_tokens,
+            }
+            if record.allocated_bytes is not None:
+                attributes["step.allocated_bytes"] = record.allocated_bytes
+
+            spans.append({
+                "traceId": _trace_id(record.run_id),
+                "spanId": record.span_id,
+                "name": record.step_id,
+                "kind": "SPAN_KIND_INTERNAL",
+                "startTimeUnixNano": str(record.start_time_ns),
+                "endTimeUnixNano": str(record.end_time_ns),
+                "attributes": [
+                    {"key": key, "value": _otel_value(value)}
+                    for key, value in attributes.items()
+                ],
+                "status": (
+                    {"code": "STATUS_CODE_ERROR", "message": record.error}
+                    if record.error else {"code": "STATUS_CODE_OK"}
+                ),
+            })
+        return spans
+
+
+def _trace_id(run_id: str) -> str:
+    """OpenTelemetry trace ids are 32 hex chars, which a UUID run id already is"""
+    try:
+        return uuid.UUID(run_id).hex
+    except ValueError:
+        return hashlib.sha256(run_id.encode("utf-8")).hexdigest()[:32]
+
+
+def _otel_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    return {"doubleValue": value}
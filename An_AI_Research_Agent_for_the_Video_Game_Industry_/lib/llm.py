@@ -1,6 +1,13 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator, Union
+from dataclasses import dataclass
+import asyncio
+import importlib.util
+import threading
+import weakref
+
+import httpx
 from pydantic import BaseModel
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
 from lib.messages import (
     AnyMessage,
     TokenUsage,
@@ -8,36 +15,138 @@ from lib.messages import (
     BaseMessage,
     UserMessage,
 )
-from lib.tooling import Tool
+from lib.tooling import Tool, ToolCall
+from lib.cache import CompletionCache
+
+
+@dataclass(frozen=True)
+class ConnectionPool:
+    """
+    Settings of the HTTP connection pool shared by every request of an LLM.
+
+    Keeping connections alive between requests saves the TCP and TLS handshakes
+    of every turn of an agent loop.
+
+    Attributes:
+        max_connections: Maximum number of concurrent connections
+        max_keepalive_connections: Maximum number of idle connections kept open
+        keepalive_expiry: Seconds an idle connection is kept open
+        http2: Use HTTP/2, multiplexing concurrent requests over one connection.
+            None enables it when the `h2` package is installed.
+    """
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 60.0
+    http2: Optional[bool] = None
+
+    @property
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    @property
+    def use_http2(self) -> bool:
+        if self.http2 is None:
+            return importlib.util.find_spec("h2") is not None
+        return self.http2
 
 
 class LLM:
+    """
+    Chat completion client.
+
+    An LLM is meant to be long-lived and shared: it keeps one connection pool
+    for all of its requests, and is safe to use from several threads. Async
+    requests use one client per event loop, since async connections can't be
+    shared across loops.
+    """
+
     def __init__(
         self,
         model: str = "gpt-4o-mini",
         temperature: float = 0.0,
         tools: Optional[List[Tool]] = None,
-        api_key: Optional[str] = None
+        api_key: Optional[str] = None,
+        pool: Optional[ConnectionPool] = None,
+        cache: Optional[CompletionCache] = None,
     ):
         self.model = model
         self.temperature = temperature
-        self.client = OpenAI(api_key=api_key) if api_key else OpenAI()
+        self.api_key = api_key
+        self.pool = pool or ConnectionPool()
+        # Only used for deterministic calls, see `_cache_key`
+        self.cache = cache
+        self.client = OpenAI(
+            api_key=api_key,
+            http_client=DefaultHttpxClient(limits=self.pool.limits, http2=self.pool.use_http2),
+        )
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
         self.tools: Dict[str, Tool] = {
             tool.name: tool for tool in (tools or [])
         }
+        self._tools_payload: Optional[List[Dict[str, Any]]] = None
+        # Last serialized conversation: agents resend the same messages plus the
+        # new ones on every turn, so only the new ones need to be converted
+        self._serialized_messages: List[BaseMessage] = []
+        self._serialized_payload: List[Dict[str, Any]] = []
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """Async OpenAI client of the running event loop, created on first use by `ainvoke`"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = AsyncOpenAI(
+                    api_key=self.api_key,
+                    http_client=DefaultAsyncHttpxClient(
+                        limits=self.pool.limits, http2=self.pool.use_http2
+                    ),
+                )
+                self._async_clients[loop] = client
+        return client
+
+    def close(self):
+        """Close the connections of the sync client"""
+        self.client.close()
 
     def register_tool(self, tool: Tool):
         self.tools[tool.name] = tool
+        self._tools_payload = None
+
+    def _serialize_messages(self, messages: List[BaseMessage]) -> List[Dict[str, Any]]:
+        """
+        Convert messages to dicts, reusing the conversion of the longest prefix
+        shared (by identity) with the previous call.
+        """
+        with self._lock:
+            previous, serialized = self._serialized_messages, self._serialized_payload
+            common, limit = 0, min(len(messages), len(previous))
+            while common < limit and messages[common] is previous[common]:
+                common += 1
+
+            serialized = serialized[:common] + [m.dict() for m in messages[common:]]
+            self._serialized_messages = list(messages)
+            self._serialized_payload = serialized
+        return list(serialized)
 
     def _build_payload(self, messages: List[BaseMessage]) -> Dict[str, Any]:
         payload = {
             "model": self.model,
             "temperature": self.temperature,
-            "messages": [m.dict() for m in messages],
+            "messages": self._serialize_messages(messages),
         }
 
         if self.tools:
-            payload["tools"] = [tool.dict() for tool in self.tools.values()]
+            if self._tools_payload is None:
+                self._tools_payload = [tool.dict() for tool in self.tools.values()]
+            payload["tools"] = self._tools_payload
             payload["tool_choice"] = "auto"
 
         return payload
@@ -52,16 +161,7 @@ class LLM:
         else:
             raise ValueError(f"Invalid input type {type(input)}.")
 
-    def invoke(self, 
-               input: str | BaseMessage | List[BaseMessage],
-               response_format: BaseModel = None,) -> AIMessage:
-        messages = self._convert_input(input)
-        payload = self._build_payload(messages)
-        if response_format:
-            payload.update({"response_format": response_format})
-            response = self.client.beta.chat.completions.parse(**payload)
-        else:
-            response = self.client.chat.completions.create(**payload)
+    def _to_ai_message(self, response) -> AIMessage:
         choice = response.choices[0]
         message = choice.message
 
@@ -78,3 +178,127 @@ class LLM:
             tool_calls=message.tool_calls,
             token_usage=token_usage
         )
+
+    def _cache_key(self, payload: Dict[str, Any], response_format: BaseModel = None) -> Optional[str]:
+        """Key of the request in the completion cache, None if it can't be cached"""
+        if self.cache is None or self.temperature != 0:
+            return None
+        return self.cache.make_key(
+            self.model, self.temperature, payload["messages"], payload.get("tools"), response_format
+        )
+
+    def _cached_message(self, key: Optional[str]) -> Optional[AIMessage]:
+        """The cached response of a request, without token usage: it cost no tokens"""
+        if key is None or (cached := self.cache.get(key)) is None:
+            return None
+        return cached.model_copy(update={"token_usage": None})
+
+    def invoke(self, 
+               input: str | BaseMessage | List[BaseMessage],
+               response_format: BaseModel = None,) -> AIMessage:
+        messages = self._convert_input(input)
+        payload = self._build_payload(messages)
+        key = self._cache_key(payload, response_format)
+        if (cached := self._cached_message(key)) is not None:
+            return cached
+
+        if response_format:
+            payload.update({"response_format": response_format})
+            response = self.client.beta.chat.completions.parse(**payload)
+        else:
+            response = self.client.chat.completions.create(**payload)
+        message = self._to_ai_message(response)
+        if key is not None:
+            self.cache.put(key, message)
+        return message
+
+    async def ainvoke(self,
+                      input: str | BaseMessage | List[BaseMessage],
+                      response_format: BaseModel = None,) -> AIMessage:
+        """Async counterpart of `invoke`, awaiting the response on the event loop"""
+        messages = self._convert_input(input)
+        payload = self._build_payload(messages)
+        key = self._cache_key(payload, response_format)
+        if (cached := self._cached_message(key)) is not None:
+            return cached
+
+        if response_format:
+            payload.update({"response_format": response_format})
+            response = await self.async_client.beta.chat.completions.parse(**payload)
+        else:
+            response = await self.async_client.chat.completions.create(**payload)
+        message = self._to_ai_message(response)
+        if key is not None:
+            self.cache.put(key, message)
+        return message
+
+    def stream(self, input: str | BaseMessage | List[BaseMessage]) -> Iterator[Union[str, AIMessage]]:
+        """
+        Stream a chat completion.
+
+        Yields the content deltas (str) as they are generated, then the complete
+        AIMessage, with the tool calls reassembled from their partial arguments.
+
+        Example:
+            >>> for chunk in llm.stream("Tell me about Zelda"):
+            ...     if isinstance(chunk, str):
+            ...         print(chunk, end="", flush=True)
+            ...     else:
+            ...         message = chunk
+        """
+        messages = self._convert_input(input)
+        payload = self._build_payload(messages)
+        key = self._cache_key(payload)
+        if (cached := self._cached_message(key)) is not None:
+            if cached.content:
+                yield cached.content
+            yield cached
+            return
+
+        payload["stream"] = True
+        payload["stream_options"] = {"include_usage": True}
+
+        content: List[str] = []
+        # Tool calls arrive in pieces, identified by their index in the message
+        tool_calls: Dict[int, Dict[str, Any]] = {}
+        token_usage = None
+
+        for chunk in self.client.chat.completions.create(**payload):
+            if chunk.usage:
+                token_usage = TokenUsage(
+                    prompt_tokens=chunk.usage.prompt_tokens,
+                    completion_tokens=chunk.usage.completion_tokens,
+                    total_tokens=chunk.usage.total_tokens
+                )
+            if not chunk.choices:
+                continue
+
+            delta = chunk.choices[0].delta
+            if delta.content:
+                content.append(delta.content)
+                yield delta.content
+
+            for call in delta.tool_calls or []:
+                partial = tool_calls.setdefault(call.index, {"id": None, "name": "", "arguments": []})
+                if call.id:
+                    partial["id"] = call.id
+                if call.function and call.function.name:
+                    partial["name"] += call.function.name
+                if call.function and call.function.arguments:
+                    partial["arguments"].append(call.function.arguments)
+
+        message = AIMessage(
+            content="".join(content) if content else None,
+            tool_calls=[
+                ToolCall(
+                    id=partial["id"],
+                    type="function",
+                    function={"name": partial["name"], "arguments": "".join(partial["arguments"])},
+                )
+                for _, partial in sorted(tool_calls.items())
+            ] or None,
+            token_usage=token_usage
+        )
+        if key is not None:
+            self.cache.put(key, message)
+        yield message
@@ -1,10 +1,11 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Union
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-import copy
+import threading
 
 from lib.documents import Document, Corpus
-from lib.vector_db import VectorStoreManager,QueryResult
+from lib.vector_db import VectorStoreManager,QueryResult,EmbeddingBatchError
+from lib.session_backends import SessionBackend, InMemorySessionBackend
 
 
 class SessionNotFoundError(Exception):
@@ -12,18 +13,77 @@ class SessionNotFoundError(Exception):
     pass
 
 
+class SessionView(Sequence):
+    """
+    Read-only view of the objects of a session, as they were when it was taken.
+
+    Session lists are only ever appended to, so a view shares the list loaded by
+    the backend instead of copying it: objects added afterwards are simply past
+    its length.
+    """
+    __slots__ = ("_objects", "_length")
+
+    def __init__(self, objects: List[Any]):
+        self._objects = objects
+        self._length = len(objects)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            return tuple(self._objects[i] for i in range(*index.indices(self._length)))
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("session index out of range")
+        return self._objects[index]
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, (SessionView, list, tuple)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self) -> str:
+        return f"SessionView({list(self)})"
+
+
 @dataclass
 class ShortTermMemory():
-    """Manage the history of objects across multiple sessions"""
-    sessions: Dict[str, List[Any]] = field(default_factory=lambda: {})
+    """
+    Manage the history of objects across multiple sessions
+
+    Sessions live in a SessionBackend: in the process by default, or in SQLite or
+    Redis so that sessions survive restarts and any worker can serve any session.
+    A session is only read when it is accessed, and only its last object for
+    `get_last_object`.
+
+    With the in-memory backend, objects are stored by reference, not copied: they
+    must not be mutated once added. Runs are frozen when they complete, so they
+    can be shared safely.
+
+    Example:
+        >>> memory = ShortTermMemory(SQLiteSessionBackend("sessions.db", ttl=3600))
+    """
+    backend: SessionBackend = field(default_factory=InMemorySessionBackend)
 
     def __post_init__(self):
         """Initialize the default session"""
         self.create_session("default")
 
+    @property
+    def sessions(self) -> Dict[str, List[Any]]:
+        """The objects of every session, by session ID
+
+        Kept for compatibility: the in-memory backend returns its own dict, the
+        persistent ones load every session.
+        """
+        if isinstance(self.backend, InMemorySessionBackend):
+            return self.backend.sessions
+        return {sid: self.backend.load(sid) for sid in self.backend.session_ids()}
+
     def __str__(self) -> str:
-        session_ids = list(self.sessions.keys())
-        return f"Memory(sessions={session_ids})"
+        return f"Memory(sessions={self.get_all_sessions()})"
 
     def __repr__(self) -> str:
         return self.__str__()
@@ -37,10 +97,7 @@ class ShortTermMemory():
         Returns:
             bool: True if session was created, False if it already existed
         """
-        if session_id in self.sessions:
-            return False
-        self.sessions[session_id] = []
-        return True
+        return self.backend.create(session_id)
 
     def delete_session(self, session_id: str) -> bool:
         """Delete a session
@@ -56,10 +113,7 @@ class ShortTermMemory():
         """
         if session_id == "default":
             raise ValueError("Cannot delete the default session")
-        if session_id not in self.sessions:
-            return False
-        del self.sessions[session_id]
-        return True
+        return self.backend.delete(session_id)
 
     def _validate_session(self, session_id: str):
         """Validate that a session exists
@@ -70,7 +124,11 @@ class ShortTermMemory():
         Raises:
             SessionNotFoundError: If session doesn't exist
         """
-        if session_id not in self.sessions:
+        if not self.backend.exists(session_id):
+            if session_id == "default":
+                # The default session always exists, even after being evicted as idle
+                self.backend.create(session_id)
+                return
             raise SessionNotFoundError(f"Session '{session_id}' not found")
 
     def add(self, object: Any, session_id: Optional[str] = None):
@@ -85,23 +143,23 @@ class ShortTermMemory():
         """
         session_id = session_id or "default"
         self._validate_session(session_id)
-        self.sessions[session_id].append(copy.deepcopy(object))
+        self.backend.append(session_id, object)
 
-    def get_all_objects(self, session_id: Optional[str] = None) -> List[Any]:
+    def get_all_objects(self, session_id: Optional[str] = None) -> SessionView:
         """Get all objects for a session
         
         Args:
             session_id: Optional session ID (uses default if None)
             
         Returns:
-            List of objects in the session
+            Read-only view of the objects in the session, in O(1)
             
         Raises:
             SessionNotFoundError: If specified session doesn't exist
         """
         session_id = session_id or "default"
         self._validate_session(session_id)
-        return [copy.deepcopy(obj) for obj in self.sessions[session_id]]
+        return SessionView(self.backend.load(session_id))
 
     def get_last_object(self, session_id: Optional[str] = None) -> Optional[Any]:
         """Get the most recent object for a session
@@ -115,12 +173,13 @@ class ShortTermMemory():
         Raises:
             SessionNotFoundError: If specified session doesn't exist
         """
-        objects = self.get_all_objects(session_id)
-        return objects[-1] if objects else None
+        session_id = session_id or "default"
+        self._validate_session(session_id)
+        return self.backend.last(session_id)
 
     def get_all_sessions(self) -> List[str]:
         """Get all session IDs"""
-        return list(self.sessions.keys())
+        return self.backend.session_ids()
 
     def reset(self, session_id: Optional[str] = None):
         """Reset memory for a specific session or all sessions
@@ -133,11 +192,11 @@ class ShortTermMemory():
         """
         if session_id is None:
             # Reset all sessions to empty lists
-            for sid in self.sessions:
-                self.sessions[sid] = []
+            for sid in self.backend.session_ids():
+                self.backend.reset(sid)
         else:
             self._validate_session(session_id)
-            self.sessions[session_id] = []
+            self.backend.reset(session_id)
 
     def pop(self, session_id: Optional[str] = None) -> Optional[Any]:
         """Remove and return the last object from a session
@@ -154,9 +213,7 @@ class ShortTermMemory():
         session_id = session_id or "default"
         self._validate_session(session_id)
         
-        if not self.sessions[session_id]:
-            return None
-        return self.sessions[session_id].pop()
+        return self.backend.pop(session_id)
 
 @dataclass
 class MemoryFragment:
@@ -221,9 +278,27 @@ class LongTermMemory:
     - Namespace-based organization
     - Time-based filtering
     - Semantic similarity search
+    
+    Namespaces, owners and memory counts are tracked in a side index kept up to
+    date by `register` and `delete`, so listing them never reads the store.
     """
     def __init__(self, db:VectorStoreManager):
         self.vector_store = db.create_store("long_term_memory", force=True)
+        # namespace -> owner -> number of memories. The store starts empty, so the
+        # index covers every memory written through this class.
+        self._index: Dict[str, Dict[str, int]] = {}
+        self._index_lock = threading.Lock()
+
+    def _update_index(self, metadatas: List[Dict], delta: int):
+        with self._index_lock:
+            for meta in metadatas:
+                owners = self._index.setdefault(meta.get("namespace", "default"), {})
+                owner = meta.get("owner")
+                owners[owner] = owners.get(owner, 0) + delta
+                if owners[owner] <= 0:
+                    del owners[owner]
+                if not owners:
+                    del self._index[meta.get("namespace", "default")]
 
     def get_namespaces(self) -> List[str]:
         """
@@ -235,11 +310,72 @@ class LongTermMemory:
         Returns:
             List[str]: List of unique namespace identifiers
         """
-        results = self.vector_store.get()
-        namespaces = [r["metadatas"][0]["namespace"] for r in results]
-        return namespaces
+        with self._index_lock:
+            return list(self._index)
+
+    def get_owners(self, namespace: Optional[str] = None) -> List[str]:
+        """
+        Retrieve the owners having memories, in one namespace or in any.
+        
+        Args:
+            namespace (Optional[str]): Namespace to list the owners of (default: all)
+            
+        Returns:
+            List[str]: List of unique owner identifiers
+        """
+        with self._index_lock:
+            if namespace is not None:
+                return list(self._index.get(namespace, {}))
+            return list(dict.fromkeys(owner for owners in self._index.values() for owner in owners))
 
-    def register(self, memory_fragment:MemoryFragment, metadata:Optional[Dict[str, str]]=None):
+    def get_owner_stats(self, owner: str) -> Dict[str, Any]:
+        """
+        Count the memories of an owner, in total and per namespace.
+        
+        Args:
+            owner (str): User identifier
+            
+        Returns:
+            Dict[str, Any]: {"owner": ..., "total": ..., "namespaces": {namespace: count}}
+        """
+        with self._index_lock:
+            namespaces = {
+                namespace: owners[owner]
+                for namespace, owners in self._index.items() if owner in owners
+            }
+        return {"owner": owner, "total": sum(namespaces.values()), "namespaces": namespaces}
+
+    def delete(self, ids: Optional[List[str]] = None, owner: Optional[str] = None,
+               namespace: Optional[str] = None) -> int:
+        """
+        Delete memories by ID, owner and/or namespace.
+        
+        Args:
+            ids (Optional[List[str]]): IDs returned by `register` / `register_many`
+            owner (Optional[str]): Delete the memories of this owner
+            namespace (Optional[str]): Delete the memories of this namespace
+            
+        Returns:
+            int: Number of deleted memories
+            
+        Raises:
+            ValueError: If neither ids, an owner nor a namespace is given, rather
+                than deleting every memory
+        """
+        if ids is None and owner is None and namespace is None:
+            raise ValueError("delete requires ids, an owner or a namespace")
+        conditions = []
+        if namespace is not None:
+            conditions.append({"namespace": {"$eq": namespace}})
+        if owner is not None:
+            conditions.append({"owner": {"$eq": owner}})
+        where = {"$and": conditions} if len(conditions) > 1 else (conditions[0] if conditions else None)
+
+        deleted = self.vector_store.delete(ids=ids, where=where)
+        self._update_index(deleted["metadatas"], -1)
+        return len(deleted["ids"])
+
+    def register(self, memory_fragment:MemoryFragment, metadata:Optional[Dict[str, str]]=None) -> str:
         """
         Store a new memory fragment in the long-term memory system.
         
@@ -250,7 +386,56 @@ class LongTermMemory:
         Args:
             memory_fragment (MemoryFragment): The memory content to store
             metadata (Optional[Dict[str, str]]): Additional metadata to associate with the memory
+            
+        Returns:
+            str: ID of the stored memory, usable with `delete`
+        """
+        document = self._to_document(memory_fragment, metadata)
+        self.vector_store.add(document)
+        self._update_index([document.metadata], 1)
+        return document.id
+
+    def register_many(self, memory_fragments: List[MemoryFragment],
+                      metadata: Optional[Union[Dict[str, str], List[Optional[Dict[str, str]]]]] = None,
+                      **batch_options) -> List[str]:
+        """
+        Store many memory fragments at once, e.g. the memories extracted from a conversation.
+        
+        The fragments are embedded in batched requests and written in bulk, instead
+        of one embedding request and one write per fragment.
+        
+        Args:
+            memory_fragments (List[MemoryFragment]): The memory contents to store
+            metadata (Optional[Union[Dict[str, str], List[Optional[Dict[str, str]]]]]):
+                Additional metadata, either shared by every fragment or one per fragment
+            **batch_options: Batching options of `VectorStore.add_many`
+                (max_batch_tokens, max_workers, ...)
+        
+        Returns:
+            List[str]: IDs of the stored memories, in the order of the fragments
+        
+        Raises:
+            ValueError: If a list of metadata doesn't match the fragments
+            EmbeddingBatchError: If some batches could not be embedded. The other
+                fragments are stored.
         """
+        if metadata is None or isinstance(metadata, dict):
+            metadata = [metadata] * len(memory_fragments)
+        elif len(metadata) != len(memory_fragments):
+            raise ValueError("metadata must have one entry per memory fragment")
+
+        documents = [self._to_document(f, m) for f, m in zip(memory_fragments, metadata)]
+        try:
+            self.vector_store.add_many(documents, **batch_options)
+        except EmbeddingBatchError as e:
+            failed = set(e.failed_ids)
+            self._update_index([d.metadata for d in documents if d.id not in failed], 1)
+            raise
+        self._update_index([d.metadata for d in documents], 1)
+        return [d.id for d in documents]
+
+    @staticmethod
+    def _to_document(memory_fragment: MemoryFragment, metadata: Optional[Dict[str, str]]) -> Document:
         complete_metadata = {
             "owner": memory_fragment.owner,
             "namespace": memory_fragment.namespace,
@@ -258,13 +443,7 @@ class LongTermMemory:
         }
         if metadata:
             complete_metadata.update(metadata)
-
-        self.vector_store.add(
-            Document(
-                content=memory_fragment.content,
-                metadata=complete_metadata,
-            )
-        )
+        return Document(content=memory_fragment.content, metadata=complete_metadata)
 
     def search(self, query_text:str, owner:str, limit:int=3,
                timestamp_filter:Optional[TimestampFilter]=None, 
@@ -286,7 +465,47 @@ class LongTermMemory:
         Returns:
             MemorySearchResult: Container with matching memory fragments and metadata
         """
+        return self.search_many([query_text], owner, limit, timestamp_filter, namespace)[0]
 
+    def search_many(self, query_texts: List[str], owner: str, limit: int = 3,
+                    timestamp_filter: Optional[TimestampFilter] = None,
+                    namespace: Optional[str] = "default") -> List[MemorySearchResult]:
+        """
+        Search for the memories relevant to several queries at once.
+        
+        Every query text is embedded in one request and searched in one vector
+        store query, with the same filters as `search`.
+        
+        Args:
+            query_texts (List[str]): The search queries
+            owner (str): User identifier to filter memories by ownership
+            limit (int): Maximum number of results per query (default: 3)
+            timestamp_filter (Optional[TimestampFilter]): Time-based filtering criteria
+            namespace (Optional[str]): Namespace to search within (default: "default")
+            
+        Returns:
+            List[MemorySearchResult]: The results of each query, in the order of the queries
+        """
+        if not query_texts:
+            return []
+
+        result: QueryResult = self.vector_store.query(
+            query_texts=list(query_texts),
+            n_results=limit,
+            where=self._where(owner, namespace, timestamp_filter)
+        )
+
+        documents = result.get("documents") or [[] for _ in query_texts]
+        metadatas = result.get("metadatas") or [[] for _ in query_texts]
+        distances = result.get("distances") or [[] for _ in query_texts]
+        return [
+            self._to_search_result(docs, metas, dists)
+            for docs, metas, dists in zip(documents, metadatas, distances)
+        ]
+
+    @staticmethod
+    def _where(owner: str, namespace: Optional[str],
+               timestamp_filter: Optional[TimestampFilter]) -> Dict:
         where = {
             "$and": [
                 {
@@ -315,36 +534,22 @@ class LongTermMemory:
                         "$lt": timestamp_filter.lower_than_value,
                     }
                 })
+        return where
 
-        result:QueryResult = self.vector_store.query(
-            query_texts=[query_text],
-            n_results=limit,
-            where=where
-        )
-
+    @staticmethod
+    def _to_search_result(documents: List[str], metadatas: List[Dict],
+                          distances: List[float]) -> MemorySearchResult:
         fragments = []
-        documents = result.get("documents", [[]])[0]
-        metadatas = result.get("metadatas", [[]])[0]
-
         for content, meta in zip(documents, metadatas):
-            owner = meta.get("owner")
-            namespace = meta.get("namespace", "default")
-            timestamp = meta.get("timestamp")
-
             fragment = MemoryFragment(
                 content=content,
-                owner=owner,
-                namespace=namespace,
-                timestamp=timestamp
+                owner=meta.get("owner"),
+                namespace=meta.get("namespace", "default"),
+                timestamp=meta.get("timestamp")
             )
-
             fragments.append(fragment)
-        
-        result_metadata = {
-            "distances": result.get("distances", [[]])[0]
-        }
 
         return MemorySearchResult(
             fragments=fragments,
-            metadata=result_metadata
+            metadata={"distances": distances}
         )
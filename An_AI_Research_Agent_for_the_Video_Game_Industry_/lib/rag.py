@@ -1,10 +1,14 @@
-from typing import TypedDict, List
+from typing import TypedDict, List, Optional
 import logging
+import time
+
+import numpy as np
 
 from lib.state_machine import StateMachine, Step, EntryPoint, Termination, Run, Resource
 from lib.llm import LLM
 from lib.messages import BaseMessage, UserMessage, SystemMessage
 from lib.vector_db import VectorStore
+from lib.semantic_cache import SemanticCache
 
 
 logging.getLogger('pdfminer').setLevel(logging.ERROR)
@@ -19,6 +23,9 @@ class RAGState(TypedDict):
     documents: List[str]
     distances: List[float]
     answer: str
+    question_embedding: np.ndarray  # Set when a semantic cache is used
+    cache_hit: bool
+    started: float  # perf_counter at the cache lookup, to measure the cost of a miss
 
 class RAG:
     """
@@ -31,16 +38,41 @@ class RAG:
     
     The RAG pattern enhances LLM responses by providing relevant external knowledge,
     reducing hallucinations and improving factual accuracy.
+
+    With a SemanticCache, questions similar to one answered before skip retrieval
+    and generation and get the cached answer.
     """
-    def __init__(self, llm: LLM, vector_store: VectorStore):
+    def __init__(self, llm: LLM, vector_store: VectorStore,
+                 cache: Optional[SemanticCache] = None):
+        self.cache = cache
         self.workflow = self._create_state_machine()
         self.resource = Resource(
             vars = {
                 "llm": llm,
                 "vector_store": vector_store,
+                "cache": cache,
             }
         )
 
+    def _cache_lookup(self, state:RAGState, resource:Resource) -> RAGState:
+        cache:SemanticCache = resource.vars.get("cache")
+        started = time.perf_counter()
+        embedding = cache.embed(state["question"])
+        hit = cache.lookup(embedding)
+        if hit is None:
+            return {"question_embedding": embedding, "cache_hit": False, "started": started}
+        return {"question_embedding": embedding, "cache_hit": True, "answer": hit[0]}
+
+    def _cache_store(self, state:RAGState, resource:Resource) -> RAGState:
+        cache:SemanticCache = resource.vars.get("cache")
+        cache.store(
+            state["question"],
+            state["answer"],
+            embedding=state["question_embedding"],
+            cost=time.perf_counter() - state["started"],
+        )
+        return {}
+
     def _retrieve(self, state:RAGState, resource:Resource) -> RAGState:
         question = state["question"]
         vector_store:VectorStore = resource.vars.get("vector_store")
@@ -90,10 +122,28 @@ class RAG:
         termination = Termination[RAGState]()
 
         machine.add_steps([entry, retrieve, augment, generate, termination])
-        machine.connect(entry, retrieve)
         machine.connect(retrieve, augment)
         machine.connect(augment, generate)
-        machine.connect(generate, termination)
+
+        if self.cache is None:
+            machine.connect(entry, retrieve)
+            machine.connect(generate, termination)
+        else:
+            cache_lookup = Step[RAGState]("cache_lookup", self._cache_lookup)
+            cache_store = Step[RAGState]("cache_store", self._cache_store)
+            machine.add_steps([cache_lookup, cache_store])
+
+            def check_cache_hit(state: RAGState) -> Step[RAGState]:
+                """Transition logic: Skip retrieval and generation on a hit"""
+                return termination if state.get("cache_hit") else retrieve
+
+            machine.connect(entry, cache_lookup)
+            machine.connect(cache_lookup, [retrieve, termination], check_cache_hit)
+            machine.connect(generate, cache_store)
+            machine.connect(cache_store, termination)
+
+        # Validate the graph now rather than on the first run
+        machine.compile()
 
         return machine
 
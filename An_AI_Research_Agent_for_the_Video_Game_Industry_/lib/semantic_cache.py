@@ -0,0 +1,167 @@
+from typing import Any, Callable, Dict, List, Literal, Optional, Sequence, Tuple
+import threading
+import time
+
+import numpy as np
+
+
+EmbeddingFunction = Callable[[List[str]], Sequence[Sequence[float]]]
+
+
+class SemanticCache:
+    """
+    Cache of answers keyed by the meaning of the question.
+
+    Questions are embedded and compared by cosine similarity against the
+    questions answered before, so "When was Pokemon Gold released?" can be
+    served the answer of "Pokemon Gold release date?". Embeddings are kept in a
+    preallocated in-process matrix, searched with a single matrix product.
+
+    When full, the least recently used entry (`eviction="lru"`) or the oldest
+    entry (`eviction="oldest"`) is replaced. Entries older than `ttl` are never
+    served.
+
+    Example:
+        >>> cache = SemanticCache(manager.embedding_function, threshold=0.92)
+        >>> rag = RAG(llm, vector_store, cache=cache)
+        >>> rag.invoke("When was Pokemon Gold released?")
+        >>> rag.invoke("Pokemon Gold release date?")  # Served from the cache
+        >>> cache.stats()
+        {'hits': 1, 'misses': 1, 'hit_rate': 0.5, 'seconds_saved': 1.8, ...}
+    """
+
+    def __init__(self,
+                 embedding_function: EmbeddingFunction,
+                 threshold: float = 0.95,
+                 max_entries: int = 512,
+                 ttl: Optional[float] = None,
+                 eviction: Literal["lru", "oldest"] = "lru"):
+        """
+        Args:
+            embedding_function: Function embedding a list of texts, e.g. the
+                embedding function of a VectorStoreManager
+            threshold: Minimum cosine similarity for a question to hit an entry
+            max_entries: Maximum number of cached answers
+            ttl: Optional lifetime of an entry in seconds
+            eviction: Entry replaced when the cache is full
+        """
+        if eviction not in ("lru", "oldest"):
+            raise ValueError(f"Unknown eviction policy: {eviction}")
+
+        self.embedding_function = embedding_function
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.eviction = eviction
+
+        # Allocated on the first store, once the embedding dimension is known
+        self._embeddings: Optional[np.ndarray] = None
+        self._created = np.zeros(max_entries)
+        self._last_used = np.zeros(max_entries)
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._questions: List[Optional[str]] = [None] * max_entries
+        self._answers: List[Any] = [None] * max_entries
+        self._costs = np.zeros(max_entries)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+
+    def __repr__(self) -> str:
+        return f"SemanticCache(entries={int(self._valid.sum())}, threshold={self.threshold})"
+
+    def embed(self, question: str) -> np.ndarray:
+        """Embed a question as a normalized float32 vector"""
+        embedding = np.asarray(self.embedding_function([question])[0], dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def lookup(self, embedding: np.ndarray) -> Optional[Tuple[Any, float]]:
+        """
+        Find the answer of the most similar cached question.
+
+        Args:
+            embedding: Normalized embedding of the question, see `embed`
+
+        Returns:
+            Tuple of (answer, similarity), or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            if self._embeddings is None or not self._valid.any():
+                self.misses += 1
+                return None
+
+            if self.ttl is not None:
+                self._valid &= (now - self._created) <= self.ttl
+
+            similarities = self._embeddings @ embedding
+            similarities[~self._valid] = -np.inf
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            self._last_used[best] = now
+            self.hits += 1
+            self.seconds_saved += float(self._costs[best])
+            return self._answers[best], similarity
+
+    def store(self, question: str, answer: Any, embedding: Optional[np.ndarray] = None,
+              cost: float = 0.0):
+        """
+        Cache the answer of a question.
+
+        Args:
+            question: The question
+            answer: Its answer
+            embedding: Normalized embedding of the question, computed if not given
+            cost: Seconds it took to produce the answer, counted as saved on every hit
+        """
+        if embedding is None:
+            embedding = self.embed(question)
+
+        now = time.time()
+        with self._lock:
+            if self._embeddings is None:
+                self._embeddings = np.zeros((self.max_entries, len(embedding)), dtype=np.float32)
+
+            slot = self._free_slot()
+            self._embeddings[slot] = embedding
+            self._questions[slot] = question
+            self._answers[slot] = answer
+            self._costs[slot] = cost
+            self._created[slot] = now
+            self._last_used[slot] = now
+            self._valid[slot] = True
+
+    def _free_slot(self) -> int:
+        free = np.flatnonzero(~self._valid)
+        if free.size:
+            return int(free[0])
+        if self.eviction == "lru":
+            return int(np.argmin(self._last_used))
+        return int(np.argmin(self._created))
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the hit and miss counters of the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "seconds_saved": self.seconds_saved,
+                "entries": int(self._valid.sum()),
+            }
+
+    def clear(self):
+        """Remove every entry and reset the counters"""
+        with self._lock:
+            self._valid[:] = False
+            self._questions = [None] * self.max_entries
+            self._answers = [None] * self.max_entries
+            self.hits = self.misses = 0
+            self.seconds_saved = 0.0
@@ -0,0 +1,351 @@
+from typing import Any, Dict, List, Optional
+from abc import ABC, abstractmethod
+import pickle
+import sqlite3
+import threading
+import time
+
+
+class SessionBackend(ABC):
+    """
+    Storage of the sessions of a ShortTermMemory.
+
+    A session is an append-only list of objects. Sessions idle for longer than
+    `ttl` seconds, i.e. without a new object, are evicted; creating a session
+    that already exists doesn't count as activity. Persistent backends store
+    pickled objects, so several processes can serve the same sessions.
+
+    Unpickling can run arbitrary code: the database or server of a persistent
+    backend must only be writable by trusted processes.
+    """
+
+    def __init__(self, ttl: Optional[float] = None):
+        """
+        Args:
+            ttl: Optional number of idle seconds after which a session is evicted
+        """
+        self.ttl = ttl
+
+    @abstractmethod
+    def create(self, session_id: str) -> bool:
+        """Create a session, returning False if it already exists. Idle sessions are evicted
+        first."""
+        pass
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """Delete a session, returning False if it didn't exist"""
+        pass
+
+    @abstractmethod
+    def exists(self, session_id: str) -> bool:
+        pass
+
+    @abstractmethod
+    def session_ids(self) -> List[str]:
+        pass
+
+    @abstractmethod
+    def append(self, session_id: str, obj: Any):
+        """Append an object to an existing session"""
+        pass
+
+    @abstractmethod
+    def load(self, session_id: str) -> List[Any]:
+        """Get the objects of a session. The list must not be modified."""
+        pass
+
+    @abstractmethod
+    def last(self, session_id: str) -> Optional[Any]:
+        """Get the last object of a session without loading the others"""
+        pass
+
+    @abstractmethod
+    def pop(self, session_id: str) -> Optional[Any]:
+        """Remove and return the last object of a session"""
+        pass
+
+    @abstractmethod
+    def reset(self, session_id: str):
+        """Remove every object of a session"""
+        pass
+
+    def evict_idle(self) -> int:
+        """Delete the sessions idle for longer than `ttl`, returning their number"""
+        return 0
+
+
+class InMemorySessionBackend(SessionBackend):
+    """Sessions kept in a dict of lists, private to the process"""
+
+    def __init__(self, ttl: Optional[float] = None):
+        super().__init__(ttl)
+        self.sessions: Dict[str, List[Any]] = {}
+        self._accessed: Dict[str, float] = {}
+
+    def __repr__(self) -> str:
+        return f"InMemorySessionBackend(sessions={len(self.sessions)})"
+
+    def create(self, session_id):
+        self.evict_idle()
+        if session_id in self.sessions:
+            return False
+        self.sessions[session_id] = []
+        self._accessed[session_id] = time.time()
+        return True
+
+    def delete(self, session_id):
+        self._accessed.pop(session_id, None)
+        return self.sessions.pop(session_id, None) is not None
+
+    def exists(self, session_id):
+        return session_id in self.sessions
+
+    def session_ids(self):
+        return list(self.sessions.keys())
+
+    def append(self, session_id, obj):
+        self.sessions[session_id].append(obj)
+        self._accessed[session_id] = time.time()
+
+    def load(self, session_id):
+        return self.sessions[session_id]
+
+    def last(self, session_id):
+        objects = self.sessions[session_id]
+        return objects[-1] if objects else None
+
+    def pop(self, session_id):
+        objects = self.sessions[session_id]
+        if not objects:
+            return None
+        # Replace the list rather than shrinking it, so loaded lists never change
+        self.sessions[session_id] = objects[:-1]
+        return objects[-1]
+
+    def reset(self, session_id):
+        self.sessions[session_id] = []
+
+    def evict_idle(self):
+        if self.ttl is None:
+            return 0
+        cutoff = time.time() - self.ttl
+        idle = [sid for sid, accessed in self._accessed.items() if accessed < cutoff]
+        for session_id in idle:
+            self.delete(session_id)
+        return len(idle)
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """
+    Sessions stored in a SQLite database in WAL mode, so processes on the same
+    host can read while one of them writes.
+
+    Objects are appended as pickled rows: a turn writes one row, and the last
+    object of a session is read without loading the others.
+
+    Example:
+        >>> memory = ShortTermMemory(SQLiteSessionBackend("sessions.db", ttl=24 * 3600))
+        >>> agent = Agent("gpt-4o-mini", "You are helpful", memory=memory)
+    """
+
+    def __init__(self, path: str, ttl: Optional[float] = None):
+        """
+        Args:
+            path: SQLite database file
+            ttl: Optional number of idle seconds after which a session is evicted
+        """
+        super().__init__(ttl)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, accessed REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_objects ("
+                "session_id TEXT NOT NULL REFERENCES sessions ON DELETE CASCADE, "
+                "seq INTEGER NOT NULL, payload BLOB NOT NULL, "
+                "PRIMARY KEY (session_id, seq))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS sessions_accessed ON sessions (accessed)"
+            )
+
+    def __repr__(self) -> str:
+        return f"SQLiteSessionBackend('{self.path}')"
+
+    def create(self, session_id):
+        self.evict_idle()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO sessions VALUES (?, ?)", (session_id, time.time())
+            )
+            return cursor.rowcount == 1
+
+    def delete(self, session_id):
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            return cursor.rowcount == 1
+
+    def exists(self, session_id):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone() is not None
+
+    def session_ids(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT session_id FROM sessions")]
+
+    def append(self, session_id, obj):
+        payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO session_objects SELECT ?, COALESCE(MAX(seq) + 1, 0), ? "
+                "FROM session_objects WHERE session_id = ?", (session_id, payload, session_id)
+            )
+            self._conn.execute(
+                "UPDATE sessions SET accessed = ? WHERE session_id = ?", (time.time(), session_id)
+            )
+
+    def load(self, session_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT payload FROM session_objects WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+        return [pickle.loads(row[0]) for row in rows]
+
+    def last(self, session_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM session_objects WHERE session_id = ? ORDER BY seq DESC LIMIT 1",
+                (session_id,)
+            ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def pop(self, session_id):
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT seq, payload FROM session_objects WHERE session_id = ? ORDER BY seq DESC LIMIT 1",
+                (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "DELETE FROM session_objects WHERE session_id = ? AND seq = ?", (session_id, row[0])
+            )
+        return pickle.loads(row[1])
+
+    def reset(self, session_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM session_objects WHERE session_id = ?", (session_id,))
+
+    def evict_idle(self):
+        if self.ttl is None:
+            return 0
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM sessions WHERE accessed < ?", (time.time() - self.ttl,)
+            )
+            return cursor.rowcount
+
+    def close(self):
+        self._conn.close()
+
+
+class RedisSessionBackend(SessionBackend):
+    """
+    Sessions stored in Redis, or any server speaking its protocol (Valkey,
+    KeyDB, ...), shared by every worker connected to it.
+
+    Each session is a list of pickled objects under `<prefix>objects:<session_id>`,
+    plus a marker key `<prefix>session:<session_id>` so that empty sessions exist. Idle sessions are evicted
+    by Redis itself: every write pushes back the expiry of both keys.
+
+    Requires the `redis` package unless a client is given.
+
+    Example:
+        >>> memory = ShortTermMemory(RedisSessionBackend(url="redis://cache:6379/0", ttl=3600))
+    """
+
+    def __init__(self,
+                 client: Any = None,
+                 url: str = "redis://localhost:6379/0",
+                 prefix: str = "short_term_memory:",
+                 ttl: Optional[float] = None):
+        """
+        Args:
+            client: Optional redis-py compatible client (default: created from `url`)
+            url: URL of the server, used when no client is given
+            prefix: Prefix of the keys of the sessions
+            ttl: Optional number of idle seconds after which a session is evicted
+        """
+        super().__init__(ttl)
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise ImportError("RedisSessionBackend requires the `redis` package") from e
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def __repr__(self) -> str:
+        return f"RedisSessionBackend(prefix='{self.prefix}')"
+
+    def _objects_key(self, session_id: str) -> str:
+        return f"{self.prefix}objects:{session_id}"
+
+    def _marker_key(self, session_id: str) -> str:
+        return f"{self.prefix}session:{session_id}"
+
+    def _expire(self, pipe: Any, session_id: str):
+        if self.ttl is not None:
+            ttl_ms = int(self.ttl * 1000)
+            pipe.pexpire(self._marker_key(session_id), ttl_ms)
+            pipe.pexpire(self._objects_key(session_id), ttl_ms)
+
+    def create(self, session_id):
+        # Only a new session gets an expiry: as with the other backends, creating
+        # an existing session doesn't refresh it
+        ttl_ms = int(self.ttl * 1000) if self.ttl is not None else None
+        return bool(self.client.set(self._marker_key(session_id), time.time(), nx=True, px=ttl_ms))
+
+    def delete(self, session_id):
+        deleted = self.client.delete(self._marker_key(session_id), self._objects_key(session_id))
+        return deleted > 0
+
+    def exists(self, session_id):
+        return bool(self.client.exists(self._marker_key(session_id)))
+
+    def session_ids(self):
+        marker_prefix = self._marker_key("")
+        return [
+            (key.decode("utf-8") if isinstance(key, bytes) else key)[len(marker_prefix):]
+            for key in self.client.scan_iter(match=f"{marker_prefix}*")
+        ]
+
+    def append(self, session_id, obj):
+        pipe = self.client.pipeline()
+        pipe.rpush(self._objects_key(session_id), pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+        self._expire(pipe, session_id)
+        pipe.execute()
+
+    def load(self, session_id):
+        return [pickle.loads(payload) for payload in self.client.lrange(self._objects_key(session_id), 0, -1)]
+
+    def last(self, session_id):
+        payload = self.client.lindex(self._objects_key(session_id), -1)
+        return pickle.loads(payload) if payload is not None else None
+
+    def pop(self, session_id):
+        payload = self.client.rpop(self._objects_key(session_id))
+        return pickle.loads(payload) if payload is not None else None
+
+    def reset(self, session_id):
+        self.client.delete(self._objects_key(session_id))
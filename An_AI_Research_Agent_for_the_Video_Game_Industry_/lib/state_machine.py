@@ -1,21 +1,65 @@
-from typing import Any, Callable, Dict, List, Optional, Union, TypeVar, Generic, cast, Type, TypedDict, get_type_hints
-from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, FrozenSet, Iterator, List, Optional, Tuple, Union, TypeVar, Generic, cast, Type, TypedDict, Annotated, get_type_hints, get_origin
+from dataclasses import FrozenInstanceError, dataclass, field, replace
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import pickle
 import uuid
-import copy
 import inspect
 
+from lib.logs import get_logger
+
+if TYPE_CHECKING:
+    from lib.checkpoint import Checkpointer
+
+
+logger = get_logger(__name__)
 
 StateSchema = TypeVar("StateSchema")
 
+# A reducer merges the current value of a field with an update: reducer(current, update) -> new value
+Reducer = Callable[[Any, Any], Any]
+
+
+def get_reducers(state_schema: Type[StateSchema]) -> Dict[str, Reducer]:
+    """Collect the per-field reducers declared on a TypedDict schema.
+
+    Reducers are declared with `Annotated`, e.g. `documents: Annotated[List[str], operator.add]`.
+    Fields without a reducer are overwritten by the value returned from a step.
+    """
+    reducers = {}
+    for name, hint in get_type_hints(state_schema, include_extras=True).items():
+        if get_origin(hint) is Annotated:
+            callables = [m for m in hint.__metadata__ if callable(m)]
+            if callables:
+                reducers[name] = callables[-1]
+    return reducers
+
+
+class InvalidWorkflowError(Exception):
+    """Raised when the workflow graph of a StateMachine fails validation"""
+    pass
+
+
 @dataclass
 class Resource:
     vars: Dict[str, Any]
 
 class Step(Generic[StateSchema]):
-    def __init__(self, step_id: str, logic: Callable[[StateSchema], Dict]):
+    def __init__(self, step_id: str, logic: Callable[[StateSchema], Dict],
+                 async_logic: Optional[Callable[[StateSchema], Awaitable[Dict]]] = None):
+        """
+        Args:
+            step_id: Unique identifier of the step
+            logic: Function taking (state) or (state, resource) and returning the updated fields.
+                It may be a coroutine function, in which case the step only runs with `arun`.
+            async_logic: Optional coroutine counterpart of `logic` used by `StateMachine.arun`,
+                with the same parameters
+        """
         self.step_id = step_id
         self.logic = logic
+        self.async_logic = async_logic
         # Store the number of parameters the logic function expects
         self.logic_params_count = self._calculate_params_count()
 
@@ -34,27 +78,59 @@ class Step(Generic[StateSchema]):
             # For regular functions
             return self.logic.__code__.co_argcount
 
-    def run(self, state: StateSchema, state_schema: Type[StateSchema], resource: Resource=None) -> StateSchema:
+    def _logic_args(self, state: StateSchema, resource: Resource = None) -> tuple:
         # Call logic function with appropriate number of arguments
         if self.logic_params_count == 1:
-            result = self.logic(state)
+            return (state,)
         elif self.logic_params_count == 2:
-            result = self.logic(state, resource)
+            return (state, resource)
+        raise ValueError(
+            f"Step '{self.step_id}' logic function must accept either 1 argument (state) "
+            f"or 2 arguments (state, resource). Found {self.logic_params_count} arguments."
+        )
+
+    def _filter_result(self, result: Dict, state_schema: Type[StateSchema],
+                       schema_fields: Optional[FrozenSet[str]] = None) -> Dict:
+        # Get expected fields from the TypedDict, unless the caller precomputed them
+        expected_fields = schema_fields if schema_fields is not None else get_type_hints(state_schema)
+
+        # Only keep fields that are defined in state_schema
+        return {
+            field: value for field, value in result.items()
+            if field in expected_fields
+        }
+
+    def execute(self, state: StateSchema, state_schema: Type[StateSchema], resource: Resource=None,
+                schema_fields: Optional[FrozenSet[str]] = None) -> Dict:
+        """Run the step logic and return only the updated fields that belong to state_schema.
+
+        `schema_fields` is the precomputed field set of state_schema; StateMachine passes
+        it so the schema is not introspected on every step.
+        """
+        if inspect.iscoroutinefunction(self.logic):
+            raise TypeError(f"Step '{self.step_id}' has async logic, use StateMachine.arun")
+        result = self.logic(*self._logic_args(state, resource))
+        return self._filter_result(result, state_schema, schema_fields)
+
+    async def aexecute(self, state: StateSchema, state_schema: Type[StateSchema], resource: Resource=None,
+                       schema_fields: Optional[FrozenSet[str]] = None) -> Dict:
+        """Async counterpart of `execute`.
+
+        Coroutine logic is awaited on the running loop; blocking logic is moved to a
+        worker thread so it doesn't stall other sessions sharing the loop.
+        """
+        args = self._logic_args(state, resource)
+        if self.async_logic is not None:
+            result = await self.async_logic(*args)
+        elif inspect.iscoroutinefunction(self.logic):
+            result = await self.logic(*args)
         else:
-            raise ValueError(
-                f"Step '{self.step_id}' logic function must accept either 1 argument (state) "
-                f"or 2 arguments (state, resource). Found {self.logic_params_count} arguments."
-            ) 
-        # Get expected fields from the TypedDict
-        expected_fields = get_type_hints(state_schema)
-        
-        # Create new state with all fields from state_schema
-        # Only copy fields that are defined in state_schema
-        updated = {**state}
-        for field, value in result.items():
-            if field in expected_fields:
-                updated[field] = value
-        
+            result = await asyncio.to_thread(self.logic, *args)
+        return self._filter_result(result, state_schema, schema_fields)
+
+    def run(self, state: StateSchema, state_schema: Type[StateSchema], resource: Resource=None) -> StateSchema:
+        # Create new state with all fields from state, overridden by the step updates
+        updated = {**state, **self.execute(state, state_schema, resource)}
         return cast(StateSchema, updated)
 
 
@@ -97,14 +173,21 @@ class Transition(Generic[StateSchema]):
         return self.targets
 
 
-@dataclass
+@dataclass(frozen=True)
 class Snapshot(Generic[StateSchema]):
-    """Represents a single state snapshot in time"""
+    """Represents a single, immutable state snapshot in time.
+
+    Snapshots share structure instead of copying it: `delta` holds only the fields
+    the step changed, and `state_data` is the state mapping built by the engine for
+    that step, which references the unchanged values of the previous state. Step
+    logic must therefore return new values rather than mutating the state in place.
+    """
     snapshot_id: str
     timestamp: datetime
     state_data: StateSchema
     state_schema: Type[StateSchema]
     step_id: str
+    delta: Dict[str, Any] = field(default_factory=dict)
 
     def __str__(self) -> str:
         return f"Snapshot('{self.snapshot_id}') @ [{self.timestamp.strftime('%Y-%m-%d %H:%M:%S.%f')}]: {self.step_id}.State({self.state_data})"
@@ -114,23 +197,97 @@ class Snapshot(Generic[StateSchema]):
 
     @classmethod
     def create(cls, state_data: StateSchema, state_schema: Type[StateSchema],
-               step_id:str) -> 'Snapshot[StateSchema]':
+               step_id:str, delta: Optional[Dict[str, Any]] = None) -> 'Snapshot[StateSchema]':
         return cls(
             snapshot_id=str(uuid.uuid4()),
             timestamp=datetime.now(),
             state_data=state_data,
             state_schema=state_schema,
             step_id=step_id,
+            delta=delta if delta is not None else {},
         )
 
 
+class RetentionPolicy(Generic[StateSchema]):
+    """Decides which snapshots a Run keeps in memory. The base policy keeps all of them."""
+
+    def retain(self, run: 'Run[StateSchema]', snapshot: Snapshot[StateSchema]):
+        run.snapshots.append(snapshot)
+
+
+class KeepLastN(RetentionPolicy[StateSchema]):
+    """Keep only the last `n` snapshots of each run in memory"""
+
+    def __init__(self, n: int):
+        if n < 1:
+            raise ValueError("KeepLastN must keep at least one snapshot")
+        self.n = n
+
+    def retain(self, run: 'Run[StateSchema]', snapshot: Snapshot[StateSchema]):
+        run.snapshots.append(snapshot)
+        if len(run.snapshots) > self.n:
+            del run.snapshots[0]
+
+
+class KeepFinal(KeepLastN[StateSchema]):
+    """Keep only the latest snapshot, enough for `Run.get_final_state`"""
+
+    def __init__(self):
+        super().__init__(1)
+
+
+class SpillToDisk(KeepLastN[StateSchema]):
+    """Write every snapshot to disk and keep only the last `keep_last` in memory.
+
+    Only the snapshot deltas are written, one pickle record per snapshot appended to
+    `<directory>/<run_id>.snapshots`. Use `load` to read back the full trace.
+    """
+
+    def __init__(self, directory: str, keep_last: int = 1):
+        super().__init__(keep_last)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, run_id: str) -> str:
+        return os.path.join(self.directory, f"{run_id}.snapshots")
+
+    def retain(self, run: 'Run[StateSchema]', snapshot: Snapshot[StateSchema]):
+        with open(self.path(run.run_id), "ab") as f:
+            pickle.dump(replace(snapshot, state_data=None), f)
+        super().retain(run, snapshot)
+
+    def load(self, run_id: str) -> List[Snapshot[StateSchema]]:
+        """Read back every spilled snapshot of a run, rebuilding their states from the deltas"""
+        snapshots = []
+        state = {}
+        with open(self.path(run_id), "rb") as f:
+            while True:
+                try:
+                    snapshot = pickle.load(f)
+                except EOFError:
+                    break
+                state = {**state, **snapshot.delta}
+                snapshots.append(replace(snapshot, state_data=state))
+        return snapshots
+
+
 @dataclass
 class Run(Generic[StateSchema]):
-    """Represents a single execution run of the state machine"""
+    """Represents a single execution run of the state machine.
+
+    `snapshots` holds the snapshots kept by the retention policy, while `trajectory`
+    always records the id of every executed step.
+
+    Once `complete`, a run is frozen: `snapshots` and `trajectory` become tuples and
+    assigning an attribute raises FrozenInstanceError. Completed runs can therefore be
+    shared, e.g. by ShortTermMemory, without defensive copies.
+    """
     run_id: str
     start_timestamp: datetime
     snapshots: List[Snapshot[StateSchema]] = field(default_factory=list)
     end_timestamp: Optional[datetime] = None
+    trajectory: List[str] = field(default_factory=list)
+    retention: RetentionPolicy[StateSchema] = field(default_factory=RetentionPolicy, repr=False)
 
     def __str__(self) -> str:
         return f"Run('{self.run_id}')"
@@ -138,11 +295,22 @@ class Run(Generic[StateSchema]):
     def __repr__(self) -> str:
         return self.__str__()
 
+    def __setattr__(self, name: str, value: Any):
+        if self.completed:
+            raise FrozenInstanceError(f"cannot assign to field '{name}' of a completed run")
+        super().__setattr__(name, value)
+
+    @property
+    def completed(self) -> bool:
+        return self.__dict__.get("_completed", False)
+
     @classmethod
-    def create(cls) -> 'Run[StateSchema]':
+    def create(cls, retention: Optional[RetentionPolicy[StateSchema]] = None,
+               run_id: Optional[str] = None) -> 'Run[StateSchema]':
         return cls(
-            run_id=str(uuid.uuid4()),
-            start_timestamp=datetime.now()
+            run_id=run_id or str(uuid.uuid4()),
+            start_timestamp=datetime.now(),
+            retention=retention or RetentionPolicy(),
         )
 
     @property
@@ -151,16 +319,22 @@ class Run(Generic[StateSchema]):
             "run_id": self.run_id,
             "start_timestamp": self.start_timestamp.strftime("%Y-%m-%d %H:%M:%S.%f"),
             "end_timestamp": self.end_timestamp.strftime("%Y-%m-%d %H:%M:%S.%f"),
-            "snapshot_counts": len(self.snapshots)
+            "snapshot_counts": len(self.trajectory)
         }
 
     def add_snapshot(self, snapshot: Snapshot[StateSchema]):
-        """Add a new snapshot to this run"""
-        self.snapshots.append(snapshot)
+        """Add a new snapshot to this run, subject to its retention policy"""
+        if self.completed:
+            raise FrozenInstanceError(f"cannot add a snapshot to completed run '{self.run_id}'")
+        self.trajectory.append(snapshot.step_id)
+        self.retention.retain(self, snapshot)
 
     def complete(self):
-        """Mark this run as complete"""
+        """Mark this run as complete and freeze it"""
         self.end_timestamp = datetime.now()
+        self.snapshots = tuple(self.snapshots)
+        self.trajectory = tuple(self.trajectory)
+        self._completed = True
 
     def get_final_state(self) -> Optional[StateSchema]:
         """Get the final state of this run"""
@@ -168,24 +342,88 @@ class Run(Generic[StateSchema]):
             return None
         return self.snapshots[-1].state_data
 
+    def replay(self, initial_state: Optional[StateSchema] = None) -> Iterator[Tuple[Snapshot[StateSchema], StateSchema]]:
+        """Rebuild the state after each snapshot from the recorded deltas.
+
+        Requires every snapshot to be kept in memory (the default retention policy);
+        use `SpillToDisk.load` for spilled runs.
+
+        Args:
+            initial_state: State the run started from. The first snapshot delta already
+                contains every field of the initial state, so it is rarely needed.
+
+        Yields:
+            Tuples of (snapshot, reconstructed state)
+        """
+        state = dict(initial_state or {})
+        for snapshot in self.snapshots:
+            state = {**state, **snapshot.delta}
+            yield snapshot, cast(StateSchema, state)
+
+
+class StepHook(Generic[StateSchema]):
+    """Instrumentation hook called around every step execution.
+
+    Subclasses override the methods they need; both are no-ops by default. With
+    parallel branches, hooks are called from worker threads.
+    """
+
+    def before_step(self, run: Run[StateSchema], step: Step[StateSchema], state: StateSchema):
+        pass
+
+    def after_step(self, run: Run[StateSchema], step: Step[StateSchema], state: StateSchema,
+                   update: Dict, error: Optional[Exception] = None):
+        """Called with the step update, or with the exception raised by the step"""
+        pass
+
 
 class StateMachine(Generic[StateSchema]):
-    def __init__(self, state_schema: Type[StateSchema]):
+    def __init__(self, state_schema: Type[StateSchema], max_workers: Optional[int] = None,
+                 retention: Optional[RetentionPolicy[StateSchema]] = None,
+                 checkpointer: Optional['Checkpointer'] = None):
+        """
+        Args:
+            state_schema: TypedDict describing the workflow state. Fields annotated with
+                `Annotated[T, reducer]` are merged with `reducer(current, update)`.
+            max_workers: Maximum number of branches executed concurrently when a
+                transition fans out to several steps (default: one thread per branch)
+            retention: Policy deciding which snapshots each Run keeps in memory
+                (default: keep all of them)
+            checkpointer: Optional store persisting every snapshot so an interrupted
+                run can be continued with `resume`
+        """
         self.state_schema = state_schema
+        self.max_workers = max_workers
+        self.retention = retention
+        self.checkpointer = checkpointer
+        self.hooks: List[StepHook[StateSchema]] = []
+        # Schema introspection is slow, so it is done once per machine rather than per step
+        self.schema_keys: List[str] = list(get_type_hints(state_schema))
+        self.schema_fields: FrozenSet[str] = frozenset(self.schema_keys)
+        self.reducers: Dict[str, Reducer] = get_reducers(state_schema)
         self.steps: Dict[str, Step[StateSchema]] = {}
         self.transitions: Dict[str, List[Transition[StateSchema]]] = {}
+        # Built by `compile`: entry point id and, per step, either its static targets
+        # or the conditional transitions to resolve at runtime
+        self._entry_id: Optional[str] = None
+        self._dispatch: Dict[str, Tuple[Optional[List[str]], Tuple[Transition[StateSchema], ...]]] = {}
+        self._compiled = False
 
     def __str__(self) -> str:
-        schema_keys = list(get_type_hints(self.state_schema).keys())
-        return f"StateMachine(schema={schema_keys})"
+        return f"StateMachine(schema={self.schema_keys})"
 
     def __repr__(self) -> str:
         return self.__str__()
 
+    def add_hook(self, hook: StepHook[StateSchema]):
+        """Register an instrumentation hook called before and after every step"""
+        self.hooks.append(hook)
+
     def add_steps(self, steps: List[Step[StateSchema]]):
         """Add steps to the workflow"""
         for step in steps:
             self.steps[step.step_id] = step
+        self._compiled = False
 
     def connect(
         self,
@@ -200,58 +438,358 @@ class StateMachine(Generic[StateSchema]):
         if src_id not in self.transitions:
             self.transitions[src_id] = []
         self.transitions[src_id].append(transition)
+        self._compiled = False
 
-    def run(self, state: StateSchema, resource: Resource = None):
-        # Validate that state has at least one field from the schema
-        expected_fields = get_type_hints(self.state_schema)
-        state_fields = set(state.keys())
-        common_fields = state_fields.intersection(expected_fields)
-        
-        if not common_fields:
-            raise ValueError(f"Initial state must have at least one field from the schema. Expected fields: {list(expected_fields.keys())}")
-
-        entry_points = [s for s in self.steps.values() if isinstance(s, EntryPoint)]
+    def compile(self) -> 'StateMachine[StateSchema]':
+        """
+        Validate the workflow graph and build the dispatch table used by `run`.
+
+        Checks that there is a single EntryPoint, that transitions only reference
+        existing steps, that every step is reachable from the EntryPoint and that a
+        Termination is reachable from every step. Conditional transitions are
+        checked against the targets declared in `connect`.
+
+        `run` compiles on first use; call it after building the graph to fail early.
+
+        Raises:
+            InvalidWorkflowError: If the graph is invalid
+        """
+        entry_points = [s.step_id for s in self.steps.values() if isinstance(s, EntryPoint)]
         if not entry_points:
-            raise Exception("No EntryPoint step found in workflow")
+            raise InvalidWorkflowError("No EntryPoint step found in workflow")
         if len(entry_points) > 1:
-            raise Exception("Multiple EntryPoint steps found in workflow")
-        
-        # Create a new run for this execution
-        current_run = Run.create()
-        
-        current_step_id = entry_points[0].step_id        
+            raise InvalidWorkflowError("Multiple EntryPoint steps found in workflow")
 
-        while current_step_id:
-            step = self.steps[current_step_id]
-            if isinstance(step, Termination):
-                print(f"[StateMachine] Terminating: {current_step_id}")
-                break
-            
-            # Replace state entirely
-            state = step.run(state, self.state_schema, resource)  
+        terminations = {s.step_id for s in self.steps.values() if isinstance(s, Termination)}
+        if not terminations:
+            raise InvalidWorkflowError("No Termination step found in workflow")
+
+        for src_id, transitions in self.transitions.items():
+            if src_id not in self.steps:
+                raise InvalidWorkflowError(f"Transition from unknown step: {src_id}")
+            for t in transitions:
+                missing = [target for target in t.targets if target not in self.steps]
+                if missing:
+                    raise InvalidWorkflowError(f"{t} targets unknown steps: {missing}")
 
-            if isinstance(step, EntryPoint):
-                print(f"[StateMachine] Starting: {current_step_id}")
+        for step_id in self.steps:
+            if step_id not in terminations and not self.transitions.get(step_id):
+                raise InvalidWorkflowError(f"No transitions found from step: {step_id}")
+
+        edges = {
+            step_id: {target for t in self.transitions.get(step_id, []) for target in t.targets}
+            for step_id in self.steps
+        }
+
+        reachable = self._traverse(entry_points, edges)
+        unreachable = [step_id for step_id in self.steps if step_id not in reachable]
+        if unreachable:
+            raise InvalidWorkflowError(f"Steps not reachable from the EntryPoint: {unreachable}")
+
+        reverse_edges: Dict[str, set] = {step_id: set() for step_id in self.steps}
+        for step_id, targets in edges.items():
+            for target in targets:
+                reverse_edges[target].add(step_id)
+        terminating = self._traverse(list(terminations), reverse_edges)
+        stuck = [step_id for step_id in self.steps if step_id not in terminating]
+        if stuck:
+            raise InvalidWorkflowError(f"Steps that can never reach a Termination: {stuck}")
+
+        self._entry_id = entry_points[0]
+        self._dispatch = {}
+        for step_id, transitions in self.transitions.items():
+            if all(t.condition is None for t in transitions):
+                static_targets = []
+                for t in transitions:
+                    static_targets += [target for target in t.targets if target not in static_targets]
+                self._dispatch[step_id] = (static_targets, ())
+            else:
+                self._dispatch[step_id] = (None, tuple(transitions))
+        self._compiled = True
+        return self
+
+    @staticmethod
+    def _traverse(start: List[str], edges: Dict[str, set]) -> set:
+        """Return every node reachable from `start` following `edges`"""
+        seen = set(start)
+        stack = list(start)
+        while stack:
+            for target in edges[stack.pop()]:
+                if target not in seen:
+                    seen.add(target)
+                    stack.append(target)
+        return seen
+
+    def _merge(self, state: StateSchema, update: Dict, written: Optional[set] = None) -> StateSchema:
+        """Merge a step update into the state, applying the schema reducers.
+
+        `written` tracks the fields already updated by sibling branches of the same
+        fan-out; writing one of them again without a reducer is ambiguous and raises.
+        """
+        reducers = self.reducers
+        merged = {**state}
+        for field, value in update.items():
+            if field in reducers and field in merged:
+                merged[field] = reducers[field](merged[field], value)
+            elif written is not None and field in written:
+                raise ValueError(
+                    f"Field '{field}' was updated by several parallel steps. "
+                    f"Declare a reducer with Annotated[..., reducer] on the state schema."
+                )
+            else:
+                merged[field] = value
+            if written is not None:
+                written.add(field)
+        return cast(StateSchema, merged)
+
+    def _execute_step(self, run: Run[StateSchema], step: Step[StateSchema], state: StateSchema,
+                      resource: Resource = None) -> Dict:
+        """Execute a single step, calling the instrumentation hooks around it"""
+        for hook in self.hooks:
+            hook.before_step(run, step, state)
+        try:
+            update = step.execute(state, self.state_schema, resource, self.schema_fields)
+        except Exception as e:
+            for hook in self.hooks:
+                hook.after_step(run, step, state, {}, e)
+            raise
+        for hook in self.hooks:
+            hook.after_step(run, step, state, update)
+        return update
+
+    async def _aexecute_step(self, run: Run[StateSchema], step: Step[StateSchema], state: StateSchema,
+                             resource: Resource = None) -> Dict:
+        """Async counterpart of `_execute_step`"""
+        for hook in self.hooks:
+            hook.before_step(run, step, state)
+        try:
+            update = await step.aexecute(state, self.state_schema, resource, self.schema_fields)
+        except Exception as e:
+            for hook in self.hooks:
+                hook.after_step(run, step, state, {}, e)
+            raise
+        for hook in self.hooks:
+            hook.after_step(run, step, state, update)
+        return update
+
+    def _execute_steps(self, run: Run[StateSchema], steps: List[Step[StateSchema]], state: StateSchema,
+                       resource: Resource = None) -> List[Tuple[str, Dict]]:
+        """Execute steps against the same state, concurrently when there is more than one"""
+        if len(steps) == 1:
+            return [(steps[0].step_id, self._execute_step(run, steps[0], state, resource))]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers or len(steps)) as executor:
+            futures = [
+                (step.step_id, executor.submit(self._execute_step, run, step, state, resource))
+                for step in steps
+            ]
+            return [(step_id, future.result()) for step_id, future in futures]
+
+    async def _aexecute_steps(self, run: Run[StateSchema], steps: List[Step[StateSchema]], state: StateSchema,
+                              resource: Resource = None) -> List[Tuple[str, Dict]]:
+        """Async counterpart of `_execute_steps`: branches are gathered on the event loop"""
+        results = await asyncio.gather(*[
+            self._aexecute_step(run, step, state, resource) for step in steps
+        ])
+        return [(step.step_id, result) for step, result in zip(steps, results)]
+
+    def _start(self, state: StateSchema) -> str:
+        """Validate the initial state and the workflow, and return the entry point step id"""
+        # Validate that state has at least one field from the schema
+        if self.schema_fields.isdisjoint(state.keys()):
+            raise ValueError(f"Initial state must have at least one field from the schema. Expected fields: {self.schema_keys}")
+
+        if not self._compiled:
+            self.compile()
+        return self._entry_id
+
+    def _runnable_steps(self, run: Run[StateSchema], step_ids: List[str]) -> List[Step[StateSchema]]:
+        """Return the steps to execute next, dropping the branches that reached a Termination"""
+        steps = []
+        for step_id in step_ids:
+            step = self.steps[step_id]
+            if isinstance(step, Termination):
+                logger.info("[StateMachine] Terminating: %s", step_id,
+                            extra={"run_id": run.run_id, "step_id": step_id})
+            else:
+                steps.append(step)
+
+        if len(steps) > 1:
+            logger.info("[StateMachine] Fan-out: %s", [s.step_id for s in steps], extra={"run_id": run.run_id})
+        return steps
+
+    def _join(self, run: Run[StateSchema], state: StateSchema,
+              updates: List[Tuple[str, Dict]]) -> Tuple[StateSchema, List[Snapshot[StateSchema]]]:
+        """Merge each branch update in order and snapshot the merged state"""
+        snapshots = []
+        written = set() if len(updates) > 1 else None
+        for step_id, update in updates:
+            state = self._merge(state, update, written)
+            # The first snapshot records the whole initial state so deltas alone can rebuild the run
+            delta = dict(state) if not run.snapshots else {f: state[f] for f in update}
+
+            if isinstance(self.steps[step_id], EntryPoint):
+                logger.info("[StateMachine] Starting: %s", step_id,
+                            extra={"run_id": run.run_id, "step_id": step_id})
             else:
-                print(f"[StateMachine] Executing step: {current_step_id}")
+                logger.info("[StateMachine] Executing step: %s", step_id,
+                            extra={"run_id": run.run_id, "step_id": step_id})
 
             # Create and add snapshot to the current run
-            snapshot = Snapshot.create(copy.deepcopy(state), self.state_schema, current_step_id)
-            current_run.add_snapshot(snapshot)
+            snapshot = Snapshot.create(state, self.state_schema, step_id, delta)
+            run.add_snapshot(snapshot)
+            snapshots.append(snapshot)
+        return state, snapshots
+
+    def _checkpoint(self, run: Run[StateSchema], previous_state: StateSchema,
+                    snapshots: List[Snapshot[StateSchema]], next_step_ids: List[str]):
+        """Persist the snapshots of the steps just executed, if a checkpointer is configured"""
+        if self.checkpointer is None:
+            return
+        from lib.checkpoint import Checkpoint, encode_delta
+
+        seq = len(run.trajectory) - len(snapshots)
+        if seq == 0:
+            # Restores replay from an empty state: the first delta can't extend anything
+            previous_state = {}
+        checkpoints = []
+        for i, snapshot in enumerate(snapshots):
+            checkpoints.append(Checkpoint(
+                run_id=run.run_id,
+                seq=seq + i,
+                snapshot_id=snapshot.snapshot_id,
+                step_id=snapshot.step_id,
+                timestamp=snapshot.timestamp,
+                delta=encode_delta(snapshot.delta, previous_state),
+                next_step_ids=next_step_ids if i == len(snapshots) - 1 else None,
+            ))
+            previous_state = snapshot.state_data
+        self.checkpointer.put(checkpoints)
+
+    def _restore(self, run_id: str) -> Tuple[Run[StateSchema], StateSchema, List[str]]:
+        """Rebuild a run from its checkpoints and return it with its state and next steps"""
+        if self.checkpointer is None:
+            raise ValueError("StateMachine needs a checkpointer to resume runs")
+        if not self._compiled:
+            self.compile()
+
+        restored, next_step_ids = self.checkpointer.restore(run_id)
+        run = Run.create(self.retention, run_id)
+        run.start_timestamp = restored[0][0].timestamp
+
+        state = {}
+        for checkpoint, state, delta in restored:
+            run.add_snapshot(Snapshot(
+                snapshot_id=checkpoint.snapshot_id,
+                timestamp=checkpoint.timestamp,
+                state_data=state,
+                state_schema=self.state_schema,
+                step_id=checkpoint.step_id,
+                delta=delta,
+            ))
+        logger.info("[StateMachine] Resuming run %s at: %s", run_id, next_step_ids,
+                    extra={"run_id": run_id})
+        return run, cast(StateSchema, state), next_step_ids
+
+    def _next_step_ids(self, steps: List[Step[StateSchema]], state: StateSchema) -> List[str]:
+        next_steps: List[str] = []
+        for step in steps:
+            static_targets, transitions = self._dispatch[step.step_id]
+            if static_targets is not None:
+                resolved = static_targets
+            else:
+                resolved = []
+                for t in transitions:
+                    resolved += t.resolve(state)
+                unknown = [s for s in resolved if s not in self.steps]
+                if unknown:
+                    raise InvalidWorkflowError(f"Step '{step.step_id}' transitioned to unknown steps: {unknown}")
+
+            if not resolved:
+                raise Exception(f"[StateMachine] No transitions found from step: {step.step_id}")
+
+            # Branches converging on the same step are joined into a single execution
+            next_steps += [s for s in resolved if s not in next_steps]
+        return next_steps
+
+    def run(self, state: StateSchema, resource: Resource = None, run_id: Optional[str] = None):
+        """
+        Execute the workflow from its EntryPoint.
+
+        Args:
+            state: Initial state
+            resource: Optional resources passed to steps accepting two arguments
+            run_id: Optional id for the run (default: random UUID), used to `resume` it
+        """
+        # Steps to execute next. More than one step means independent branches
+        # that run concurrently and are joined before moving on.
+        current_step_ids = [self._start(state)]
 
-            transitions = self.transitions.get(current_step_id, [])
-            next_steps: List[str] = []
+        # Create a new run for this execution
+        current_run = Run.create(self.retention, run_id)
+        return self._run_loop(current_run, state, current_step_ids, resource)
+
+    def is_finished(self, run_id: str) -> bool:
+        """Whether every branch of a checkpointed run already reached a Termination, so
+        resuming it only rebuilds the run"""
+        if self.checkpointer is None:
+            raise ValueError("StateMachine needs a checkpointer to resume runs")
+        next_step_ids = next(
+            (c.next_step_ids for c in reversed(self.checkpointer.get(run_id)) if c.next_step_ids is not None),
+            None,
+        )
+        return next_step_ids is not None and all(
+            isinstance(self.steps[step_id], Termination) for step_id in next_step_ids
+        )
 
-            for t in transitions:
-                next_steps += t.resolve(state)
+    def resume(self, run_id: str, resource: Resource = None):
+        """Continue a checkpointed run from its last completed step"""
+        current_run, state, current_step_ids = self._restore(run_id)
+        return self._run_loop(current_run, state, current_step_ids, resource)
+
+    def _run_loop(self, current_run: Run[StateSchema], state: StateSchema,
+                  current_step_ids: List[str], resource: Resource = None):
+        while current_step_ids:
+            steps = self._runnable_steps(current_run, current_step_ids)
+            if not steps:
+                break
 
-            if not next_steps:
-                raise Exception(f"[StateMachine] No transitions found from step: {current_step_id}")
+            updates = self._execute_steps(current_run, steps, state, resource)
+            previous_state = state
+            state, snapshots = self._join(current_run, state, updates)
+            current_step_ids = self._next_step_ids(steps, state)
+            self._checkpoint(current_run, previous_state, snapshots, current_step_ids)
 
-            if len(next_steps) > 1:
-                raise NotImplementedError("Parallel execution not implemented yet.")
+        current_run.complete()
+        return current_run
+
+    async def arun(self, state: StateSchema, resource: Resource = None, run_id: Optional[str] = None):
+        """Async counterpart of `run`.
+
+        Steps with coroutine logic are awaited, so many runs can share one event loop
+        while waiting on I/O. Blocking steps run in worker threads.
+        """
+        current_step_ids = [self._start(state)]
+        current_run = Run.create(self.retention, run_id)
+        return await self._arun_loop(current_run, state, current_step_ids, resource)
+
+    async def aresume(self, run_id: str, resource: Resource = None):
+        """Async counterpart of `resume`"""
+        current_run, state, current_step_ids = self._restore(run_id)
+        return await self._arun_loop(current_run, state, current_step_ids, resource)
+
+    async def _arun_loop(self, current_run: Run[StateSchema], state: StateSchema,
+                         current_step_ids: List[str], resource: Resource = None):
+        while current_step_ids:
+            steps = self._runnable_steps(current_run, current_step_ids)
+            if not steps:
+                break
 
-            current_step_id = next_steps[0]
+            updates = await self._aexecute_steps(current_run, steps, state, resource)
+            previous_state = state
+            state, snapshots = self._join(current_run, state, updates)
+            current_step_ids = self._next_step_ids(steps, state)
+            self._checkpoint(current_run, previous_state, snapshots, current_step_ids)
 
         current_run.complete()
         return current_run
@@ -1,3 +1,4 @@
+import copy
 import inspect
 import datetime
 from typing import (
@@ -29,6 +30,8 @@ class Tool:
             self._build_param_schema(key, param)
             for key, param in self.signature.parameters.items()
         ]
+        # Built once: the schema is sent with every LLM request
+        self._schema = self._build_schema()
 
     def _build_param_schema(self, name: str, param: inspect.Parameter):
         param_type = self.type_hints.get(name, str)
@@ -82,7 +85,7 @@ class Tool:
 
         return {"type": mapping.get(typ, "string")}
 
-    def dict(self) -> dict:
+    def _build_schema(self) -> dict:
         return {
             "type": "function",
             "function": {
@@ -102,6 +105,15 @@ class Tool:
             }
         }
 
+    def dict(self) -> dict:
+        """
+        Get the JSON schema of the tool, in the OpenAI tools format.
+
+        The schema is built once; each call returns a copy, which callers may modify.
+        LLM serializes its tools once, so requests don't pay for the copy.
+        """
+        return copy.deepcopy(self._schema)
+
     def __call__(self, *args, **kwargs):
         return self.func(*args, **kwargs)
 
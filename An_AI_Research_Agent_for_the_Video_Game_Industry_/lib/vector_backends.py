@@ -0,0 +1,395 @@
+from typing import Any, Callable, Dict, List, Literal, Optional, Sequence
+from abc import ABC, abstractmethod
+import threading
+
+import numpy as np
+from chromadb.api.models.Collection import Collection as ChromaCollection
+from chromadb.api.types import QueryResult, GetResult
+
+
+EmbeddingFunction = Callable[[List[str]], Sequence[Sequence[float]]]
+
+
+class VectorBackend(ABC):
+    """
+    Storage and search engine behind a VectorStore.
+
+    Results follow the ChromaDB layout: `query` returns one list per query text
+    for each of ids, documents, metadatas and distances; `get` returns flat lists.
+    """
+
+    @abstractmethod
+    def add(self, ids: List[str], documents: List[str], metadatas: List[Optional[Dict[str, Any]]],
+            embeddings: Optional[Sequence[Sequence[float]]] = None):
+        """Add documents, embedding them if `embeddings` is not given. Ids that
+        already exist are ignored."""
+        pass
+
+    @abstractmethod
+    def query(self, query_texts: List[str], n_results: int = 3,
+              where: Optional[Dict[str, Any]] = None,
+              where_document: Optional[Dict[str, Any]] = None) -> QueryResult:
+        """Find the documents most similar to each query text"""
+        pass
+
+    @abstractmethod
+    def get(self, ids: Optional[List[str]] = None,
+            where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None) -> GetResult:
+        """Get documents by id or metadata filter"""
+        pass
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        """Delete documents by id. Unknown ids are ignored."""
+        pass
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of stored documents"""
+        pass
+
+
+class ChromaBackend(VectorBackend):
+    """Backend storing documents in a ChromaDB collection"""
+
+    def __init__(self, collection: ChromaCollection):
+        self.collection = collection
+
+    def __repr__(self) -> str:
+        return f"ChromaBackend('{self.collection.name}')"
+
+    def add(self, ids, documents, metadatas, embeddings=None):
+        self.collection.add(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    def query(self, query_texts, n_results=3, where=None, where_document=None):
+        return self.collection.query(
+            query_texts=query_texts,
+            n_results=n_results,
+            where=where,
+            where_document=where_document,
+            include=['documents', 'distances', 'metadatas']
+        )
+
+    def get(self, ids=None, where=None, limit=None):
+        return self.collection.get(
+            ids=ids,
+            where=where,
+            limit=limit,
+            include=['documents', 'metadatas']
+        )
+
+    def delete(self, ids):
+        if ids:
+            self.collection.delete(ids=ids)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+
+_COMPARISONS = {
+    "$eq": lambda value, target: value == target,
+    "$ne": lambda value, target: value != target,
+    "$gt": lambda value, target: value is not None and value > target,
+    "$gte": lambda value, target: value is not None and value >= target,
+    "$lt": lambda value, target: value is not None and value < target,
+    "$lte": lambda value, target: value is not None and value <= target,
+    "$in": lambda value, target: value in target,
+    "$nin": lambda value, target: value not in target,
+}
+
+
+def matches_where(metadata: Optional[Dict[str, Any]], where: Optional[Dict[str, Any]]) -> bool:
+    """
+    Evaluate a ChromaDB `where` filter against the metadata of a document.
+
+    Supports `$and`, `$or`, the comparison operators `$eq`, `$ne`, `$gt`,
+    `$gte`, `$lt`, `$lte`, `$in`, `$nin`, and the `{"field": value}` shorthand
+    for `$eq`.
+
+    Example:
+        >>> matches_where({"owner": "ana", "timestamp": 5},
+        ...               {"$and": [{"owner": {"$eq": "ana"}}, {"timestamp": {"$gt": 3}}]})
+        True
+    """
+    if not where:
+        return True
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, c) for c in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, c) for c in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, target in condition.items():
+                if operator not in _COMPARISONS:
+                    raise ValueError(f"Unsupported where operator: {operator}")
+                if not _COMPARISONS[operator](value, target):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def matches_where_document(document: str, where_document: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a ChromaDB `where_document` filter (`$contains`, `$not_contains`,
+    `$and`, `$or`) against a document"""
+    if not where_document:
+        return True
+    for key, condition in where_document.items():
+        if key == "$and":
+            if not all(matches_where_document(document, c) for c in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where_document(document, c) for c in condition):
+                return False
+        elif key == "$contains":
+            if condition not in document:
+                return False
+        elif key == "$not_contains":
+            if condition in document:
+                return False
+        else:
+            raise ValueError(f"Unsupported where_document operator: {key}")
+    return True
+
+
+class NumpyBackend(VectorBackend):
+    """
+    In-process vector index on a contiguous float32 matrix.
+
+    Embeddings are L2-normalized, so similarity is a matrix product and
+    distances are cosine distances (1 - cosine similarity). All query texts
+    are scored in one batched product.
+
+    Two search modes:
+    - "exact": scores every stored vector
+    - "ivf": inverted file index. Vectors are clustered with k-means into
+      `n_lists` lists and a query only scores the vectors of its `n_probe`
+      closest lists. Faster on large collections, at the cost of some recall.
+      Until `min_train_size` vectors are stored, search is exact.
+
+    `where` and `where_document` filters are applied before scoring, so a
+    query returns `n_results` matches whenever enough documents match. In IVF
+    mode, a query whose probed lists hold too few matches probes twice as many
+    lists until it finds enough or has scored them all.
+
+    Example:
+        >>> backend = NumpyBackend(manager.embedding_function, index="ivf")
+        >>> store = VectorStore(backend, manager.embedding_function)
+    """
+
+    def __init__(self,
+                 embedding_function: EmbeddingFunction,
+                 index: Literal["exact", "ivf"] = "exact",
+                 n_lists: Optional[int] = None,
+                 n_probe: int = 8,
+                 min_train_size: int = 1024):
+        """
+        Args:
+            embedding_function: Function embedding a list of texts
+            index: Search mode, "exact" or "ivf"
+            n_lists: Number of IVF lists (default: about sqrt of the collection size)
+            n_probe: Number of IVF lists scored per query
+            min_train_size: Number of vectors needed to build the IVF index
+        """
+        if index not in ("exact", "ivf"):
+            raise ValueError(f"Unknown index type: {index}")
+
+        self.embedding_function = embedding_function
+        self.index = index
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.min_train_size = min_train_size
+
+        self._vectors: Optional[np.ndarray] = None  # (capacity, dim), first `_size` rows used
+        self._size = 0
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Optional[Dict[str, Any]]] = []
+        self._rows: Dict[str, int] = {}
+
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments: Optional[np.ndarray] = None
+        self._trained_size = 0
+        self._lock = threading.RLock()
+
+    def __repr__(self) -> str:
+        return f"NumpyBackend(index='{self.index}', count={self._size})"
+
+    def count(self) -> int:
+        return self._size
+
+    def _normalize(self, vectors: Any) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def add(self, ids, documents, metadatas, embeddings=None):
+        with self._lock:
+            new, seen = [], set()
+            for i, id_ in enumerate(ids):
+                if id_ not in self._rows and id_ not in seen:
+                    seen.add(id_)
+                    new.append(i)
+            if not new:
+                return
+
+            if embeddings is None:
+                vectors = self._normalize(self.embedding_function([documents[i] for i in new]))
+            else:
+                vectors = self._normalize([embeddings[i] for i in new])
+
+            self._reserve(self._size + len(new), vectors.shape[1])
+            start = self._size
+            self._vectors[start:start + len(new)] = vectors
+            for offset, i in enumerate(new):
+                self._rows[ids[i]] = start + offset
+                self.ids.append(ids[i])
+                self.documents.append(documents[i])
+                self.metadatas.append(metadatas[i] if metadatas else None)
+            self._size += len(new)
+
+            if self.index == "ivf":
+                if self._centroids is None or self._size >= 2 * self._trained_size:
+                    self._train()
+                else:
+                    self._assignments = np.concatenate(
+                        [self._assignments, self._nearest_lists(vectors)]
+                    )
+
+    def _reserve(self, size: int, dim: int):
+        """Grow the matrix geometrically so appends are amortized O(1)"""
+        if self._vectors is None:
+            self._vectors = np.zeros((max(size, 1024), dim), dtype=np.float32)
+        elif size > len(self._vectors):
+            grown = np.zeros((max(size, 2 * len(self._vectors)), dim), dtype=np.float32)
+            grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+
+    def _nearest_lists(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)
+
+    def _train(self, iterations: int = 10):
+        """Cluster the stored vectors with spherical k-means"""
+        if self._size < self.min_train_size:
+            self._centroids = self._assignments = None
+            return
+
+        vectors = self._vectors[:self._size]
+        n_lists = min(self.n_lists or max(1, int(np.sqrt(self._size))), self._size)
+        rng = np.random.default_rng(0)
+        centroids = vectors[rng.choice(self._size, n_lists, replace=False)]
+        for _ in range(iterations):
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, vectors)
+            empty = ~sums.any(axis=1)
+            sums[empty] = centroids[empty]  # Keep the centroid of an empty list
+            centroids = self._normalize(sums)
+
+        self._centroids = centroids
+        self._assignments = self._nearest_lists(vectors)
+        self._trained_size = self._size
+
+    def _filter_mask(self, where, where_document) -> Optional[np.ndarray]:
+        if not where and not where_document:
+            return None
+        return np.fromiter(
+            (matches_where(m, where) and matches_where_document(d, where_document)
+             for m, d in zip(self.metadatas, self.documents)),
+            dtype=bool, count=self._size
+        )
+
+    def query(self, query_texts, n_results=3, where=None, where_document=None):
+        if isinstance(query_texts, str):
+            query_texts = [query_texts]
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if not query_texts:
+            return result
+
+        queries = self._normalize(self.embedding_function(list(query_texts)))
+        with self._lock:
+            if self._size == 0:
+                for key in result:
+                    result[key] = [[] for _ in query_texts]
+                return result
+
+            vectors = self._vectors[:self._size]
+            mask = self._filter_mask(where, where_document)
+            use_ivf = self.index == "ivf" and self._centroids is not None
+
+            if not use_ivf:
+                # One batched product for every query
+                scores = queries @ vectors.T
+                if mask is not None:
+                    scores[:, ~mask] = -np.inf
+
+            for q, query in enumerate(queries):
+                if use_ivf:
+                    lists = np.argsort(-(self._centroids @ query))
+                    n_probe = self.n_probe
+                    while True:
+                        candidates = np.isin(self._assignments, lists[:n_probe])
+                        if mask is not None:
+                            candidates &= mask
+                        rows = np.flatnonzero(candidates)
+                        # A filter can leave the closest lists short of matches
+                        if len(rows) >= n_results or n_probe >= len(lists):
+                            break
+                        n_probe *= 2
+                    row_scores = vectors[rows] @ query
+                else:
+                    rows = np.arange(self._size) if mask is None else np.flatnonzero(mask)
+                    row_scores = scores[q, rows]
+
+                k = min(n_results, len(rows))
+                top = np.argpartition(-row_scores, k - 1)[:k] if k else np.array([], dtype=int)
+                top = top[np.argsort(-row_scores[top])]
+                selected = rows[top]
+
+                result["ids"].append([self.ids[i] for i in selected])
+                result["documents"].append([self.documents[i] for i in selected])
+                result["metadatas"].append([self.metadatas[i] for i in selected])
+                result["distances"].append([float(1 - s) for s in row_scores[top]])
+        return result
+
+    def get(self, ids=None, where=None, limit=None):
+        with self._lock:
+            if ids is not None:
+                rows = [self._rows[i] for i in ids if i in self._rows]
+            else:
+                rows = range(self._size)
+            rows = [r for r in rows if matches_where(self.metadatas[r], where)][:limit]
+            return {
+                "ids": [self.ids[r] for r in rows],
+                "documents": [self.documents[r] for r in rows],
+                "metadatas": [self.metadatas[r] for r in rows],
+            }
+
+    def delete(self, ids):
+        with self._lock:
+            rows = [self._rows[i] for i in set(ids) if i in self._rows]
+            if not rows:
+                return
+
+            keep = np.ones(self._size, dtype=bool)
+            keep[rows] = False
+            size = int(keep.sum())
+            # Compact the matrix in place; the rows after `size` are free capacity
+            self._vectors[:size] = self._vectors[:self._size][keep]
+            kept = np.flatnonzero(keep)
+            self.ids = [self.ids[r] for r in kept]
+            self.documents = [self.documents[r] for r in kept]
+            self.metadatas = [self.metadatas[r] for r in kept]
+            self._rows = {id_: row for row, id_ in enumerate(self.ids)}
+            self._size = size
+
+            if self._assignments is not None:
+                if self._size < self.min_train_size:
+                    self._centroids = self._assignments = None
+                else:
+                    self._assignments = self._assignments[keep]
@@ -1,5 +1,8 @@
-from typing import List, Optional, Dict, Any, Union
+from typing import List, Optional, Dict, Any, Union, Iterable, Literal
 from typing_extensions import TypedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import os
+import time
 import chromadb
 from chromadb.utils import embedding_functions
 from chromadb.api.models.Collection import Collection as ChromaCollection
@@ -7,16 +10,35 @@ from chromadb.api.types import EmbeddingFunction, QueryResult, GetResult
 
 from lib.loaders import PDFLoader
 from lib.documents import Document, Corpus
+from lib.logs import get_logger
+from lib.embedding_cache import EmbeddingCache, CachedOpenAIEmbeddingFunction
+from lib.vector_backends import VectorBackend, ChromaBackend, NumpyBackend
+
+
+logger = get_logger(__name__)
+
+
+class EmbeddingBatchError(Exception):
+    """Raised when some batches of a bulk ingestion still fail after retries"""
+
+    def __init__(self, message: str, failed_ids: List[str]):
+        super().__init__(message)
+        self.failed_ids = failed_ids
+
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token count of a text, about 4 characters per token for English"""
+    return len(text) // 4 + 1
 
 
 class VectorStore:
     """
-    High-level interface for vector database operations using ChromaDB.
+    High-level interface for vector database operations.
     
     This class provides a simplified API for storing and querying document embeddings
-    in a ChromaDB collection. It handles the conversion between our Document/Corpus
-    abstractions and ChromaDB's expected data formats, making vector operations
-    more intuitive and type-safe.
+    in a VectorBackend: a ChromaDB collection or the in-process NumpyBackend. It
+    handles the conversion between our Document/Corpus abstractions and the
+    backend's batch format, making vector operations more intuitive and type-safe.
     
     The VectorStore supports:
     - Adding individual documents, document lists, or corpus collections
@@ -25,8 +47,21 @@ class VectorStore:
     - Automatic embedding generation via OpenAI
     """
 
-    def __init__(self, chroma_collection: ChromaCollection):
-        self._collection = chroma_collection
+    def __init__(self, backend: Union[VectorBackend, ChromaCollection],
+                 embedding_function: Optional[EmbeddingFunction] = None):
+        """
+        Args:
+            backend: The underlying VectorBackend, or a ChromaDB collection
+            embedding_function: Optional embedding function of the backend. It
+                lets `add_many` embed batches concurrently before writing them.
+        """
+        if not isinstance(backend, VectorBackend):
+            backend = ChromaBackend(backend)
+        self._backend = backend
+        self._embedding_function = embedding_function
+
+    def __repr__(self) -> str:
+        return f"VectorStore({self._backend})"
 
     def add(self, item: Union[Document, Corpus, List[Document]]):
         """
@@ -60,12 +95,100 @@ class VectorStore:
 
         item_dict = item.to_dict()
 
-        self._collection.add(
+        self._backend.add(
             documents=item_dict["contents"],
             ids=item_dict["ids"],
             metadatas=item_dict["metadatas"]
         )
 
+    def add_many(self, documents: Iterable[Document],
+                 max_batch_tokens: int = 100_000,
+                 max_batch_size: int = 2048,
+                 max_workers: int = 4,
+                 max_retries: int = 3,
+                 retry_delay: float = 1.0):
+        """
+        Bulk-add documents, embedding them in large concurrent batches.
+        
+        Documents are grouped into batches bounded by an estimated token budget
+        and a maximum number of inputs, the limits of an embedding request. At
+        most `max_workers` batches are embedded at the same time. Batches whose
+        embedding fails are retried with exponential backoff; batches that
+        succeeded are not embedded again. Errors of the backend are not retried.
+        
+        Args:
+            documents (Iterable[Document]): Documents to add
+            max_batch_tokens (int): Estimated token budget of a batch
+            max_batch_size (int): Maximum number of documents in a batch
+            max_workers (int): Maximum number of concurrent embedding requests
+            max_retries (int): Number of retries of a failed batch
+            retry_delay (float): Delay before the first retry, in seconds
+            
+        Raises:
+            EmbeddingBatchError: If embedding some batches still fails after the
+                retries. Its `failed_ids` are the ids of the documents not added.
+                
+        Example:
+            >>> store.add_many(corpus)  # 10k documents -> a few requests
+        """
+        batches = []
+        batch, batch_tokens = [], 0
+        for doc in documents:
+            tokens = _estimate_tokens(doc.content)
+            if batch and (batch_tokens + tokens > max_batch_tokens or len(batch) >= max_batch_size):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(doc)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+
+        pending = batches
+        for attempt in range(max_retries + 1):
+            if attempt:
+                delay = retry_delay * 2 ** (attempt - 1)
+                logger.warning("Retrying %d failed batches in %.1fs", len(pending), delay)
+                time.sleep(delay)
+            pending = self._add_batches(pending, max_workers)
+            if not pending:
+                return
+
+        failed_ids = [doc.id for batch in pending for doc in batch]
+        raise EmbeddingBatchError(
+            f"{len(pending)} batches ({len(failed_ids)} documents) failed after {max_retries} retries",
+            failed_ids,
+        )
+
+    def _add_batches(self, batches: List[List[Document]], max_workers: int) -> List[List[Document]]:
+        """Embed and add batches concurrently, returning the batches whose embedding failed"""
+        failed = []
+
+        def embed(batch: List[Document]):
+            if self._embedding_function is None:
+                return None  # Embedded by the backend when added
+            return self._embedding_function([doc.content for doc in batch])
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(embed, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    embeddings = future.result()
+                except Exception as e:
+                    # Embedding requests fail transiently (rate limits, timeouts): retried
+                    logger.warning("Embedding a batch of %d documents failed: %r", len(batch), e)
+                    failed.append(batch)
+                    continue
+                # Errors of the backend itself won't go away on retry: raised right away
+                batch_dict = Corpus(batch).to_dict()
+                self._backend.add(
+                    documents=batch_dict["contents"],
+                    ids=batch_dict["ids"],
+                    metadatas=batch_dict["metadatas"],
+                    embeddings=embeddings,
+                )
+        return failed
+
     def query(self, query_texts: str | List[str], n_results: int = 3,
               where: Optional[Dict[str, Any]] = None,
               where_document: Optional[Dict[str, Any]] = None) -> QueryResult:
@@ -97,12 +220,11 @@ class VectorStore:
             >>> for doc, distance in zip(results['documents'][0], results['distances'][0]):
             ...     print(f"Similarity: {1-distance:.3f}, Content: {doc[:100]}...")
         """
-        return self._collection.query(
+        return self._backend.query(
             query_texts=query_texts,
             n_results=n_results,
             where=where,
             where_document=where_document,
-            include=['documents', 'distances', 'metadatas']
         )
 
     def get(self, ids: Optional[List[str]] = None, 
@@ -121,7 +243,7 @@ class VectorStore:
             limit (Optional[int]): Maximum number of documents to return
             
         Returns:
-            GetResult: ChromaDB result containing the requested documents
+            GetResult: Result containing the requested documents
                 with their metadata and IDs
                 
         Example:
@@ -131,34 +253,74 @@ class VectorStore:
             >>> # Get all documents from a specific source
             >>> docs = store.get(where={"source": "research_papers"}, limit=10)
         """
-        return self._collection.get(
-            ids=ids,
-            where=where,
-            limit=limit,
-            include=['documents', 'distances', 'metadatas']
-        )
+        return self._backend.get(ids=ids, where=where, limit=limit)
+
+    def delete(self, ids: Optional[List[str]] = None,
+               where: Optional[Dict[str, Any]] = None) -> GetResult:
+        """
+        Delete documents by ID or metadata filter.
+        
+        Args:
+            ids (Optional[List[str]]): IDs of the documents to delete
+            where (Optional[Dict[str, Any]]): Metadata filter of the documents to
+                delete, combined with `ids` if both are given
+                
+        Returns:
+            GetResult: The deleted documents with their metadata and IDs
+            
+        Raises:
+            ValueError: If neither ids nor a filter is given
+            
+        Example:
+            >>> store.delete(where={"source": "outdated_report"})
+        """
+        if ids is None and where is None:
+            raise ValueError("delete requires ids or a where filter")
+        deleted = self._backend.get(ids=ids, where=where)
+        self._backend.delete(deleted["ids"])
+        return deleted
 
 class VectorStoreManager:
     """
-    Factory and lifecycle manager for ChromaDB vector stores.
+    Factory and lifecycle manager for vector stores.
     
-    This class handles the creation, configuration, and management of ChromaDB
-    collections with OpenAI embeddings. It provides a centralized way to manage
-    multiple vector stores within an application, handling the underlying ChromaDB
-    client and embedding function configuration.
+    This class handles the creation, configuration, and management of vector
+    stores with OpenAI embeddings. It provides a centralized way to manage
+    multiple vector stores within an application, handling the underlying
+    backend and embedding function configuration.
     
     Key responsibilities:
-    - ChromaDB client initialization and management
+    - Backend initialization: ChromaDB collections, or in-process NumpyBackend indexes
     - OpenAI embedding function configuration
     - Vector store creation with consistent settings
     - Store lifecycle management (create, get, delete)
     """
 
-    def __init__(self, openai_api_key: str):
+    def __init__(self, openai_api_key: str, embedding_cache: Optional[EmbeddingCache] = None,
+                 backend: Literal["chroma", "numpy"] = "chroma",
+                 backend_options: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            openai_api_key: API key of the OpenAI embeddings
+            embedding_cache: Optional persistent cache, so a text already embedded
+                by any store (or any run) is not embedded again
+            backend: "chroma" for ChromaDB collections, "numpy" for in-process
+                NumpyBackend indexes
+            backend_options: Options of the NumpyBackend, e.g. {"index": "ivf"}
+        """
+        if backend not in ("chroma", "numpy"):
+            raise ValueError(f"Unknown backend: {backend}")
+
         self.chroma_client = chromadb.Client()
+        self.embedding_cache = embedding_cache
         self.embedding_function = self._create_embedding_function(openai_api_key)
+        self.backend = backend
+        self.backend_options = backend_options or {}
+        self._numpy_stores: Dict[str, VectorStore] = {}
 
     def _create_embedding_function(self, api_key: str) -> EmbeddingFunction:
+        if self.embedding_cache is not None:
+            return CachedOpenAIEmbeddingFunction(self.embedding_cache, api_key=api_key)
         embeddings_fn = embedding_functions.OpenAIEmbeddingFunction(
             api_key=api_key
         )
@@ -167,10 +329,17 @@ class VectorStoreManager:
     def __repr__(self):
         return f"VectorStoreManager():{self.chroma_client}"
 
+    def _create_numpy_store(self, store_name: str) -> VectorStore:
+        backend = NumpyBackend(self.embedding_function, **self.backend_options)
+        self._numpy_stores[store_name] = VectorStore(backend, self.embedding_function)
+        return self._numpy_stores[store_name]
+
     def get_store(self, name: str) -> Optional[VectorStore]:
+        if self.backend == "numpy":
+            return self._numpy_stores.get(name)
         try:
             chroma_collection = self.chroma_client.get_collection(name)
-            return VectorStore(chroma_collection)
+            return VectorStore(chroma_collection, self.embedding_function)
         except Exception:
             return None
 
@@ -178,24 +347,36 @@ class VectorStoreManager:
         if force:
             self.delete_store(store_name)
 
+        if self.backend == "numpy":
+            if store_name in self._numpy_stores:
+                logger.warning("Pass `force=True` or use `get_or_create_store` method")
+                return self._numpy_stores[store_name]
+            return self._create_numpy_store(store_name)
+
         try:
             chroma_collection = self.chroma_client.create_collection(
                 name=store_name,
                 embedding_function=self.embedding_function
             )
         except Exception as e:
-            print(f"Pass `force=True` or use `get_or_create_store` method")
+            logger.warning("Pass `force=True` or use `get_or_create_store` method")
 
-        return VectorStore(chroma_collection)
+        return VectorStore(chroma_collection, self.embedding_function)
 
     def get_or_create_store(self, store_name: str) -> VectorStore:
+        if self.backend == "numpy":
+            return self.get_store(store_name) or self._create_numpy_store(store_name)
+
         chroma_collection = self.chroma_client.get_or_create_collection(
             name=store_name,
             embedding_function=self.embedding_function
         )
-        return VectorStore(chroma_collection)
+        return VectorStore(chroma_collection, self.embedding_function)
 
     def delete_store(self, store_name: str):
+        if self.backend == "numpy":
+            self._numpy_stores.pop(store_name, None)
+            return
         try:
             self.chroma_client.delete_collection(name=store_name)
         except Exception:
@@ -242,11 +423,40 @@ class CorpusLoaderService:
             >>> results = store.query(["machine learning methodology"])
         """
         store = self.manager.get_or_create_store(store_name)
-        print(f"VectorStore `{store_name}` ready!")
+        logger.info("VectorStore `%s` ready!", store_name)
 
         loader = PDFLoader(pdf_path)
         document = loader.load()
-        store.add(document)
-        print(f"Pages from `{pdf_path}` added!")
+        store.add_many(document)
+        logger.info("Pages from `%s` added!", pdf_path)
+
+        return store
+
+    def load_pdfs(self, store_name: str, pdf_paths: List[str], **batch_options) -> VectorStore:
+        """
+        Load several PDF files into a vector store with a single bulk ingestion.
+        
+        Pages of all files are embedded together in large batches (see
+        `VectorStore.add_many`), instead of one request per file. Page ids are
+        prefixed with the file name, e.g. `paper.pdf:3`.
+        
+        Args:
+            store_name (str): Name of the vector store to create or use
+            pdf_paths (List[str]): Paths to the PDF files to load
+            **batch_options: Batching options passed to `VectorStore.add_many`
+            
+        Returns:
+            VectorStore: The vector store containing the loaded PDF content
+        """
+        store = self.manager.get_or_create_store(store_name)
+
+        corpus = Corpus()
+        for pdf_path in pdf_paths:
+            prefix = os.path.basename(pdf_path)
+            for page in PDFLoader(pdf_path).load():
+                corpus.append(Document(id=f"{prefix}:{page.id}", content=page.content,
+                                       metadata=page.metadata))
+        store.add_many(corpus, **batch_options)
+        logger.info("%d pages from %d files added!", len(corpus), len(pdf_paths))
 
         return store
@@ -0,0 +1,118 @@
+"""
+Measure how many agent sessions one process serves with `Agent.invoke` and
+with `Agent.ainvoke`.
+
+Starts a local fake chat-completions server that answers every request after a
+fixed delay, standing in for the OpenAI API, then runs the same sessions:
+- "sync": one `Agent.invoke` after the other, the blocking path
+- "async": every `Agent.ainvoke` at once on one event loop
+
+No API key or network access is needed, and the fake server returns fixed
+answers, so runs are reproducible.
+
+Usage:
+    python scripts/bench_async_agents.py --sessions 300 --latency 0.1
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def make_handler(latency: float):
+    class FakeChatCompletions(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep connections alive, like the OpenAI API
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            body = json.dumps({
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": "gpt-4o-mini",
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": "Super Mario Bros."},
+                }],
+                "usage": {"prompt_tokens": 20, "completion_tokens": 4, "total_tokens": 24},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeChatCompletions
+
+
+def start_server(latency: float) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(latency))
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def report(mode: str, sessions: int, elapsed: float):
+    print(f"{mode:<6} {sessions:5d} sessions in {elapsed:7.2f}s   {sessions / elapsed:8.1f} sessions/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--sessions", type=int, default=300, help="Number of agent sessions")
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds the fake server takes per request")
+    parser.add_argument("--connections", type=int, default=100, help="Size of the LLM connection pool")
+    parser.add_argument("--sync-sessions", type=int, default=None,
+                        help="Sessions run on the sync path (default: --sessions)")
+    args = parser.parse_args()
+
+    server = start_server(args.latency)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+    from lib.agents import Agent
+    from lib.llm import ConnectionPool
+    from lib.logs import configure_logging
+
+    configure_logging(logging.WARNING)  # Step logs would dominate the timings
+
+    def make_agent() -> Agent:
+        pool = ConnectionPool(max_connections=args.connections,
+                              max_keepalive_connections=args.connections, http2=False)
+        return Agent("gpt-4o-mini", "You know video games", pool=pool)
+
+    print(f"Fake server latency {args.latency * 1000:.0f} ms, pool of {args.connections} connections")
+
+    sync_sessions = args.sync_sessions or args.sessions
+    agent = make_agent()
+    start = time.perf_counter()
+    for i in range(sync_sessions):
+        agent.invoke("Best selling game?", session_id=f"sync-{i}")
+    report("sync", sync_sessions, time.perf_counter() - start)
+
+    async def run_async():
+        agent = make_agent()
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            agent.ainvoke("Best selling game?", session_id=f"async-{i}") for i in range(args.sessions)
+        ))
+        report("async", args.sessions, time.perf_counter() - start)
+
+    asyncio.run(run_async())
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from lib.agents import CONTEXT_STEP_ID, Agent
+from lib.checkpoint import SQLiteCheckpointer
+from lib.context import ContextWindow
+from lib.evaluation import AgentEvaluator, TestCase as EvaluationCase
+from lib.messages import AIMessage, TokenUsage, ToolMessage
+from lib.tooling import ToolCall, tool
+
+
+@tool
+def add(a: int, b: int) -> int:
+    """Add two numbers"""
+    return a + b
+
+
+class FakeLLM:
+    """Calls the add tool once, then answers"""
+
+    def invoke(self, messages, *args, **kwargs):
+        if isinstance(messages[-1], ToolMessage):
+            return AIMessage(content=messages[-1].content, token_usage=TokenUsage(total_tokens=3))
+        call = ToolCall.model_validate({
+            "id": "call_1", "type": "function",
+            "function": {"name": "add", "arguments": '{"a": 1, "b": 2}'},
+        })
+        return AIMessage(content="", tool_calls=[call], token_usage=TokenUsage(total_tokens=3))
+
+
+def make_agent(**kwargs) -> Agent:
+    agent = Agent("gpt-4o-mini", "You add numbers", tools=[add], **kwargs)
+    agent.llm = FakeLLM()
+    return agent
+
+
+def test_unbudgeted_agent_trajectory_is_unchanged():
+    run = make_agent().invoke("What is 1 + 2?")
+    assert list(run.trajectory) == ["__entry__", "message_prep", "llm_processor", "tool_executor", "llm_processor"]
+
+
+def test_unbudgeted_agent_counts_context_tokens():
+    run = make_agent().invoke("What is 1 + 2?")
+    state = run.get_final_state()
+    # Counted on the messages sent to the last LLM call, i.e. without its answer
+    assert state["context_tokens"] == ContextWindow().count(state["messages"][:-1])
+    assert state["context_tokens"] > 0
+
+
+def test_context_window_is_not_counted_as_a_step():
+    budgeted = make_agent(context_window=ContextWindow(max_tokens=1000)).invoke("What is 1 + 2?")
+    assert CONTEXT_STEP_ID in budgeted.trajectory
+
+    evaluator = AgentEvaluator()
+    test_case = EvaluationCase(id="add", description="Add", user_query="What is 1 + 2?",
+                               expected_tools=["add"], max_steps=4)
+    for run in [make_agent().invoke("What is 1 + 2?"), budgeted]:
+        result = evaluator.evaluate_trajectory(test_case, run)
+        assert result.task_completion.steps_taken == 4
+
+
+def test_resume_completed_run_keeps_session_history(tmp_path):
+    agent = make_agent(checkpointer=SQLiteCheckpointer(str(tmp_path / "checkpoints.db")))
+    first = agent.invoke("What is 1 + 2?", run_id="first")
+    second = agent.invoke("And 1 + 2 again?", run_id="second")
+
+    resumed = agent.resume("first")
+    assert resumed.run_id == first.run_id
+    assert [run.run_id for run in agent.get_session_runs()] == ["first", "second"]
+    assert agent.memory.get_last_object().run_id == second.run_id
+
+
+def test_resume_second_turn_of_session(tmp_path):
+    agent = make_agent(checkpointer=SQLiteCheckpointer(str(tmp_path / "checkpoints.db")))
+    agent.invoke("What is 1 + 2?", run_id="first")
+    second = agent.invoke("And 1 + 2 again?", run_id="second")
+
+    resumed = agent.workflow.resume("second")
+    assert resumed.get_final_state()["messages"] == second.get_final_state()["messages"]
@@ -0,0 +1,28 @@
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from lib.checkpoint import Checkpoint, FileSystemCheckpointer
+
+
+def make_checkpoint(seq, next_step_ids=None):
+    return Checkpoint(run_id="run", seq=seq, snapshot_id=f"snap-{seq}", step_id=f"step-{seq}",
+                      timestamp=datetime.now(), delta="{}", next_step_ids=next_step_ids)
+
+
+def test_put_after_interrupted_write(tmp_path):
+    checkpointer = FileSystemCheckpointer(str(tmp_path))
+    checkpointer.put([make_checkpoint(0, ["step-1"])])
+    checkpointer.put([make_checkpoint(1, ["step-2"])])
+
+    # Crash in the middle of writing the second line
+    path = checkpointer._path("run")
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 10)
+
+    checkpointer.put([make_checkpoint(1, ["step-2"])])
+    checkpoints = checkpointer.get("run")
+    assert [c.seq for c in checkpoints] == [0, 1]
+    assert checkpoints[-1].next_step_ids == ["step-2"]
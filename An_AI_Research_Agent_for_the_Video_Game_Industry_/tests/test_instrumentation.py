@@ -0,0 +1,26 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from lib.agents import Agent
+from lib.instrumentation import StepProfiler
+from lib.messages import AIMessage, TokenUsage
+
+
+class FakeLLM:
+    def invoke(self, messages, *args, **kwargs):
+        return AIMessage(content="Zelda",
+                         token_usage=TokenUsage(prompt_tokens=10, completion_tokens=2, total_tokens=12))
+
+
+def test_profiler_splits_agent_token_usage():
+    agent = Agent("gpt-4o-mini", "You know games")
+    agent.llm = FakeLLM()
+    profiler = StepProfiler()
+    agent.workflow.add_hook(profiler)
+
+    run = agent.invoke("What is the best selling game?")
+    llm_record, = [r for r in profiler.records_for(run.run_id) if r.step_id == "llm_processor"]
+    assert (llm_record.prompt_tokens, llm_record.completion_tokens, llm_record.total_tokens) == (10, 2, 12)
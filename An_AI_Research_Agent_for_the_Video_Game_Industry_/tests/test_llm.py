@@ -0,0 +1,40 @@
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from lib.cache import CompletionCache
+from lib.llm import LLM
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **payload):
+        self.calls += 1
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="Zelda", tool_calls=None))],
+            usage=SimpleNamespace(prompt_tokens=10, completion_tokens=2, total_tokens=12),
+        )
+
+
+def test_cache_hits_have_no_token_usage():
+    llm = LLM(temperature=0.0, cache=CompletionCache())
+    completions = FakeCompletions()
+    llm.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    first = llm.invoke("What is the best selling game?")
+    assert first.token_usage.total_tokens == 12
+
+    second = llm.invoke("What is the best selling game?")
+    assert completions.calls == 1
+    assert second.content == "Zelda"
+    assert second.token_usage is None
+
+    streamed = list(llm.stream("What is the best selling game?"))
+    assert streamed[-1].token_usage is None
+    # Hits are copies: the original response keeps its usage
+    assert first.token_usage.total_tokens == 12
@@ -0,0 +1,16 @@
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from lib.logs import ROOT_LOGGER_NAME, get_logger
+
+
+def test_import_keeps_propagation(caplog):
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    assert root.propagate
+
+    with caplog.at_level(logging.INFO):
+        get_logger("lib.agents").info("Step %s", "llm_processor")
+    assert caplog.messages == ["Step llm_processor"]
@@ -0,0 +1,94 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+from chromadb.api.types import Documents, EmbeddingFunction
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from lib import session_backends
+from lib.memory import LongTermMemory, MemoryFragment, ShortTermMemory
+from lib.session_backends import InMemorySessionBackend, RedisSessionBackend, SQLiteSessionBackend
+from lib.vector_db import VectorStoreManager
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+def redis_backend(ttl=None):
+    return RedisSessionBackend(client=fakeredis.FakeRedis(), ttl=ttl)
+
+
+LOCAL_BACKENDS = [
+    pytest.param(InMemorySessionBackend, id="InMemorySessionBackend"),
+    pytest.param(lambda ttl=None: SQLiteSessionBackend(":memory:", ttl=ttl), id="SQLiteSessionBackend"),
+]
+BACKENDS = LOCAL_BACKENDS + [
+    pytest.param(redis_backend, id="RedisSessionBackend",
+                 marks=pytest.mark.skipif(fakeredis is None, reason="fakeredis is not installed")),
+]
+
+
+@pytest.mark.parametrize("make_backend", BACKENDS)
+def test_sessions_property(make_backend):
+    memory = ShortTermMemory(make_backend())
+    memory.create_session("s")
+    memory.add("a", "s")
+    memory.add("b")
+    assert memory.sessions == {"default": ["b"], "s": ["a"]}
+
+
+@pytest.mark.parametrize("make_backend", LOCAL_BACKENDS)
+def test_create_does_not_refresh_ttl(make_backend, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(session_backends, "time", SimpleNamespace(time=lambda: now[0]))
+    memory = ShortTermMemory(make_backend(ttl=10))
+    memory.create_session("s")
+    now[0] += 6
+    assert not memory.create_session("s")
+    now[0] += 6
+    memory.create_session("other")
+    assert "s" not in memory.get_all_sessions()
+
+
+@pytest.mark.skipif(fakeredis is None, reason="fakeredis is not installed")
+def test_redis_create_does_not_refresh_ttl():
+    backend = redis_backend(ttl=3600)
+    backend.create("s")
+    backend.client.pexpire(backend._marker_key("s"), 1000)
+    assert not backend.create("s")
+    assert 0 < backend.client.pttl(backend._marker_key("s")) <= 1000
+
+
+class FakeEmbeddings(EmbeddingFunction):
+    def __init__(self):
+        pass
+
+    def __call__(self, input: Documents):
+        return [[float(len(text)), 1.0] for text in input]
+
+    @staticmethod
+    def name():
+        return "fake"
+
+
+class FakeVectorStoreManager(VectorStoreManager):
+    def _create_embedding_function(self, api_key):
+        return FakeEmbeddings()
+
+
+def test_long_term_memory_delete():
+    memory = LongTermMemory(FakeVectorStoreManager("sk-test", backend="numpy"))
+    kept = memory.register(MemoryFragment(content="likes RPGs", owner="ana"))
+    memory.register(MemoryFragment(content="likes racing games", owner="bob"))
+
+    with pytest.raises(ValueError, match="requires ids, an owner or a namespace"):
+        memory.delete()
+
+    assert memory.delete(owner="bob") == 1
+    assert memory.get_owners() == ["ana"]
+    assert memory.delete(ids=[kept]) == 1
+    assert memory.get_namespaces() == []
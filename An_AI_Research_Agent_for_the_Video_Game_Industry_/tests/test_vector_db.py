@@ -0,0 +1,73 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from lib.documents import Document
+from lib.vector_backends import NumpyBackend
+from lib.vector_db import VectorStore
+
+
+class FlakyEmbeddings:
+    """Fails the first call, like a rate-limited embedding API"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, input):
+        self.calls += 1
+        if self.calls == 1:
+            raise TimeoutError("embedding request timed out")
+        return [[float(len(text)), 1.0] for text in input]
+
+
+def make_documents(n):
+    return [Document(id=f"doc-{i}", content="x" * (i + 1)) for i in range(n)]
+
+
+def test_add_many_retries_embedding_errors():
+    embeddings = FlakyEmbeddings()
+    store = VectorStore(NumpyBackend(embeddings), embedding_function=embeddings)
+    store.add_many(make_documents(3), retry_delay=0.0)
+    assert store._backend.count() == 3
+    assert embeddings.calls == 2
+
+
+def test_add_many_raises_backend_errors_without_retry():
+    class BrokenBackend(NumpyBackend):
+        adds = 0
+
+        def add(self, *args, **kwargs):
+            BrokenBackend.adds += 1
+            raise ValueError("dimension mismatch")
+
+    embeddings = lambda input: [[1.0, 0.0] for _ in input]
+    store = VectorStore(BrokenBackend(embeddings), embedding_function=embeddings)
+    with pytest.raises(ValueError, match="dimension mismatch"):
+        store.add_many(make_documents(3), retry_delay=0.0)
+    assert BrokenBackend.adds == 1
+
+
+def random_backend(n, **kwargs):
+    rng = np.random.default_rng(1)
+    embeddings = lambda input: rng.normal(size=(len(input), 8))
+    backend = NumpyBackend(embeddings, index="ivf", **kwargs)
+    backend.add([f"doc-{i}" for i in range(n)], [f"doc {i}" for i in range(n)],
+                [{"even": i % 2 == 0, "i": i} for i in range(n)])
+    return backend
+
+
+def test_ivf_filtered_query_widens_probe():
+    backend = random_backend(400, n_lists=20, n_probe=1, min_train_size=100)
+    result = backend.query(["query"], n_results=10, where={"i": {"$lt": 15}})
+    assert len(result["ids"][0]) == 10
+    assert all(m["i"] < 15 for m in result["metadatas"][0])
+
+
+def test_ivf_more_lists_than_vectors():
+    backend = random_backend(5, n_lists=64, min_train_size=1)
+    assert len(backend._centroids) == 5
+    assert len(backend.query(["query"], n_results=3)["ids"][0]) == 3
@@ -0,0 +1,221 @@
+from contextlib import contextmanager
+import hashlib
+import os
+import re
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+_DIGEST = re.compile(r"[0-9a-f]{64}")
+
+
+@contextmanager
+def _exclusive_lock(path):
+    """Holds an exclusive lock on a file, across every process and cache instance."""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)  # Released when the file is closed
+            yield
+            return
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _recover(vectors_path, index_path):
+    """
+    Reads the index of a model and repairs the files after an interrupted write, before
+    anything is appended. Must be called with the lock of the model held.
+
+    Only newline-terminated index lines count: a partial last line is removed from the
+    file, otherwise the next append would be glued onto it and shift every later row.
+    The vectors file is truncated to the rows listed in the index.
+
+    Returns:
+    tuple: (dimension or None, list of the sha256 of the rows, size of the index file).
+    """
+    content = ""
+    if os.path.exists(index_path):
+        with open(index_path, encoding="ascii") as f:
+            content = f.read()
+    lines = content.split("\n")[:-1]  # The last element is "" or a partial line
+    dim = int(lines[0]) if lines and lines[0].isdigit() and int(lines[0]) > 0 else None
+    hashes = []
+    if dim is not None:
+        for line in lines[1:]:
+            if not _DIGEST.fullmatch(line):
+                break
+            hashes.append(line)
+        # Rows are written before their index line, but never trust an index past the vectors
+        size = os.path.getsize(vectors_path) if os.path.exists(vectors_path) else 0
+        hashes = hashes[:size // (dim * 4)]
+
+    complete = "" if dim is None else f"{dim}\n" + "".join(f"{digest}\n" for digest in hashes)
+    if content != complete:
+        with open(f"{index_path}.tmp", "w", encoding="ascii") as f:
+            f.write(complete)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{index_path}.tmp", index_path)
+    if os.path.exists(vectors_path):
+        size = len(hashes) * dim * 4 if dim is not None else 0
+        if os.path.getsize(vectors_path) != size:
+            with open(vectors_path, "r+b") as f:
+                f.truncate(size)
+    return dim, hashes, len(complete)
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of text embeddings, keyed by (model, sha256(text)).
+
+    For each model, embeddings are appended to a float32 matrix file, read back
+    through a memory map, and the sha256 of the text of each row is appended to
+    an index file. A text that was embedded once, by any agent or any run, is
+    never sent to the embeddings API again.
+
+    Several processes or cache instances can share the directory: appends hold an
+    exclusive lock on a .lock file, first read the rows appended by the others, then
+    write at the row count of the vectors file.
+    """
+
+    def __init__(self, directory="embedding_cache"):
+        """
+        Parameters:
+        directory (str): Directory of the cache files.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # model -> {"rows": {sha256: row}, "dim": int, "count": rows of the vectors file,
+        #           "index_size": bytes of the index read, "matrix": np.memmap}
+        self._models = {}
+
+    def _paths(self, model):
+        name = re.sub(r"[^A-Za-z0-9._-]", "_", model)
+        return (os.path.join(self.directory, f"{name}.f32"),
+                os.path.join(self.directory, f"{name}.idx"),
+                os.path.join(self.directory, f"{name}.lock"))
+
+    def _recover(self, model, entry):
+        vectors_path, index_path, _ = self._paths(model)
+        entry["dim"], hashes, entry["index_size"] = _recover(vectors_path, index_path)
+        entry["rows"] = {digest: row for row, digest in enumerate(hashes)}
+        entry["count"] = len(hashes)
+        entry["matrix"] = None  # Remapped on the next read
+
+    def _load(self, model):
+        if model in self._models:
+            return self._models[model]
+
+        entry = {}
+        with _exclusive_lock(self._paths(model)[2]):
+            self._recover(model, entry)
+        self._models[model] = entry
+        return entry
+
+    def _sync(self, model, entry):
+        """Reads the rows appended by other writers since the last read. Requires the lock."""
+        vectors_path, index_path, _ = self._paths(model)
+        index_size = os.path.getsize(index_path) if os.path.exists(index_path) else 0
+        vectors_size = os.path.getsize(vectors_path) if os.path.exists(vectors_path) else 0
+        if index_size > entry["index_size"] and entry["dim"] is not None:
+            with open(index_path, "rb") as f:
+                f.seek(entry["index_size"])
+                tail = f.read(index_size - entry["index_size"]).decode("ascii", errors="replace")
+            lines = tail.split("\n")
+            if lines[-1] == "" and all(_DIGEST.fullmatch(line) for line in lines[:-1]):
+                for digest in lines[:-1]:
+                    entry["rows"][digest] = entry["count"]
+                    entry["count"] += 1
+                entry["index_size"] = index_size
+        expected = entry["count"] * entry["dim"] * 4 if entry["dim"] is not None else 0
+        if index_size != entry["index_size"] or vectors_size != expected:
+            # Rewritten, or left torn by a writer that crashed: read it again and repair it
+            self._recover(model, entry)
+
+    def _append(self, model, entry, digests, vectors):
+        vectors_path, index_path, lock_path = self._paths(model)
+        with _exclusive_lock(lock_path):
+            self._sync(model, entry)
+            new = {}
+            for digest, vector in zip(digests, vectors):
+                if digest not in entry["rows"]:
+                    new.setdefault(digest, vector)
+            if not new:
+                return
+            vectors = np.stack(list(new.values()))
+
+            header = ""
+            if entry["dim"] is None:
+                entry["dim"] = vectors.shape[1]
+                header = f"{entry['dim']}\n"
+                open(vectors_path, "wb").close()  # Drop rows left without an index
+                open(index_path, "w").close()
+
+            with open(vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            lines = header + "".join(f"{digest}\n" for digest in new)
+            with open(index_path, "a", encoding="ascii") as f:
+                f.write(lines)
+
+            for digest in new:
+                entry["rows"][digest] = entry["count"]
+                entry["count"] += 1
+            entry["index_size"] += len(lines)
+
+    def embed(self, texts, embed_fn, model):
+        """
+        Returns the embeddings of texts, calling embed_fn only for the texts not cached.
+
+        Parameters:
+        texts (list): Texts to embed.
+        embed_fn (callable): Function embedding a list of texts, called once
+            with the distinct texts missing from the cache.
+        model (str): Name of the embedding model, part of the cache key.
+
+        Returns:
+        np.ndarray: float32 array of shape (len(texts), dimension).
+        """
+        digests = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+        with self._lock:
+            entry = self._load(model)
+            missing = {d: t for d, t in zip(digests, texts) if d not in entry["rows"]}
+
+        if missing:
+            vectors = np.asarray(embed_fn(list(missing.values())), dtype=np.float32)
+            with self._lock:
+                self._append(model, entry, list(missing), vectors)
+
+        with self._lock:
+            if not texts:
+                return np.zeros((0, entry["dim"] or 0), dtype=np.float32)
+            if entry["matrix"] is None or len(entry["matrix"]) != entry["count"]:
+                vectors_path = self._paths(model)[0]
+                entry["matrix"] = np.memmap(vectors_path, dtype=np.float32, mode="r",
+                                            shape=(entry["count"], entry["dim"]))
+            return np.array(entry["matrix"][[entry["rows"][d] for d in digests]])
+
+
+_default_cache = None
+
+
+def get_default_cache():
+    """Returns the embedding cache shared by all agents, in ./embedding_cache."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = EmbeddingCache()
+    return _default_cache
@@ -0,0 +1,53 @@
+import os, sys
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PHASE2_DIR = os.path.abspath(os.path.join(BASE_DIR, ".."))
+PROJECT_ROOT = os.path.abspath(os.path.join(PHASE2_DIR, ".."))
+PHASE1_DIR = os.path.join(PROJECT_ROOT, "phase_1")
+sys.path.insert(0, PHASE1_DIR)
+
+import numpy as np
+
+from workflow_agents.embedding_cache import EmbeddingCache
+
+MODEL = "text-embedding-3-small"
+
+
+def fake_embed(texts):
+    return [[float(len(text)), float(ord(text[0])), 1.0] for text in texts]
+
+
+def test_recovers_from_interrupted_write(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    cache.embed(["a", "bb"], fake_embed, MODEL)
+
+    # Crash while appending a row: partial vector bytes and a partial index line
+    vectors_path, index_path, _ = cache._paths(MODEL)
+    with open(vectors_path, "ab") as f:
+        f.write(b"\x00" * 6)
+    with open(index_path, "a", encoding="ascii") as f:
+        f.write("0123abcd")
+
+    cache = EmbeddingCache(str(tmp_path))
+    cache.embed(["ccc"], fake_embed, MODEL)
+    cache.embed(["dddd"], fake_embed, MODEL)
+
+    cache = EmbeddingCache(str(tmp_path))
+    texts = ["a", "bb", "ccc", "dddd"]
+    # Every text must be read from the cache
+    vectors = cache.embed(texts, lambda missing: [], MODEL)
+    np.testing.assert_array_equal(vectors, np.asarray(fake_embed(texts), dtype=np.float32))
+    assert os.path.getsize(vectors_path) == len(texts) * 3 * 4
+
+
+def test_instances_sharing_a_directory(tmp_path):
+    first = EmbeddingCache(str(tmp_path))
+    second = EmbeddingCache(str(tmp_path))
+    first.embed(["a"], fake_embed, MODEL)
+    second.embed(["bb"], fake_embed, MODEL)
+    first.embed(["ccc", "bb"], fake_embed, MODEL)
+    second.embed(["dddd"], fake_embed, MODEL)
+
+    texts = ["a", "bb", "ccc", "dddd"]
+    expected = np.asarray(fake_embed(texts), dtype=np.float32)
+    for cache in [first, second, EmbeddingCache(str(tmp_path))]:
+        np.testing.assert_array_equal(cache.embed(texts, fake_embed, MODEL), expected)
@@ -3,10 +3,33 @@ import numpy as np
 import pandas as pd
 import re
 import csv
-import uuid
+import json
+import hashlib
 import os
-from datetime import datetime
+import sys
+import logging
 from openai import OpenAI
+from workflow_agents.embedding_cache import get_default_cache
+
+class _ConsoleHandler(logging.StreamHandler):
+    """Default output: plain messages on stdout. Once the application configures logging,
+    records only propagate to its handlers."""
+
+    def emit(self, record):
+        if not logging.getLogger().handlers:
+            super().emit(record)
+
+
+# Agent progress is logged at INFO level on stdout, or through the handlers of the
+# application once it configures logging; raise the level
+# (e.g. logger.setLevel(logging.WARNING)) to silence it.
+logger = logging.getLogger("workflow_agents")
+if not logger.handlers:
+    _handler = _ConsoleHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+if logger.level == logging.NOTSET:
+    logger.setLevel(logging.INFO)
 
 # DirectPromptAgent class definition
 class DirectPromptAgent:
@@ -112,7 +135,8 @@ class RAGKnowledgePromptAgent:
     and leverages embeddings to respond to prompts based solely on retrieved information.
     """
 
-    def __init__(self, openai_api_key, persona, chunk_size=2000, chunk_overlap=100):
+    def __init__(self, openai_api_key, persona, chunk_size=2000, chunk_overlap=100, embedding_cache=None,
+                 index_name=None):
         """
         Initializes the RAGKnowledgePromptAgent with API credentials and configuration settings.
 
@@ -121,12 +145,55 @@ class RAGKnowledgePromptAgent:
         persona (str): Persona description for the agent.
         chunk_size (int): The size of text chunks for embedding. Defaults to 2000.
         chunk_overlap (int): Overlap between consecutive chunks. Defaults to 100.
+        embedding_cache (EmbeddingCache): Cache of the embeddings. Defaults to the shared cache.
+        index_name (str): Name of the persistent knowledge index. Defaults to a name derived from
+            the persona, so a restarted agent reuses the index of the previous run and edits of its
+            knowledge update that index. Agents sharing a persona but not their knowledge need
+            distinct names.
         """
         self.persona = persona
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
         self.openai_api_key = openai_api_key
-        self.unique_filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.csv"
+        self.embedding_cache = embedding_cache or get_default_cache()
+        self.index_name = index_name or self._default_index_name(persona)
+        # Normalized embedding matrix, chunk metadata and live rows, reloaded when the index changes
+        self._knowledge = None
+        self._knowledge_version = None
+
+    @staticmethod
+    def _default_index_name(persona):
+        digest = hashlib.sha256(persona.encode("utf-8")).hexdigest()
+        return f"knowledge_{digest[:12]}"
+
+    @property
+    def unique_filename(self):
+        return f"{self.index_name}.csv"
+
+    @property
+    def embeddings_path(self):
+        return f"embeddings-{self.index_name}.npy"
+
+    @property
+    def metadata_path(self):
+        return f"embeddings-{self.index_name}.json"
+
+    @staticmethod
+    def chunk_id(text):
+        """Content-addressed ID of a chunk: identical text always gets the same ID."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+    def _embed(self, texts):
+        def embed(texts):
+            client = OpenAI(base_url="https://openai.vocareum.com/v1", api_key=self.openai_api_key)
+            response = client.embeddings.create(
+                model="text-embedding-3-large",
+                input=texts,
+                encoding_format="float"
+            )
+            return [item.embedding for item in response.data]
+
+        return self.embedding_cache.embed(texts, embed, "text-embedding-3-large")
 
     def get_embedding(self, text):
         """
@@ -138,13 +205,7 @@ class RAGKnowledgePromptAgent:
         Returns:
         list: The embedding vector.
         """
-        client = OpenAI(base_url="https://openai.vocareum.com/v1", api_key=self.openai_api_key)
-        response = client.embeddings.create(
-            model="text-embedding-3-large",
-            input=text,
-            encoding_format="float"
-        )
-        return response.data[0].embedding
+        return self._embed([text])[0].tolist()
 
     def calculate_similarity(self, vector_one, vector_two):
         """
@@ -173,10 +234,11 @@ class RAGKnowledgePromptAgent:
         separator = "\n"
         text = re.sub(r'\s+', ' ', text).strip()
 
-        if len(text) <= self.chunk_size:
-            return [{"chunk_id": 0, "text": text, "chunk_size": len(text)}]
+        chunks, start = [], 0
 
-        chunks, start, chunk_id = [], 0, 0
+        if len(text) <= self.chunk_size:
+            chunks.append({"chunk_id": self.chunk_id(text), "text": text, "chunk_size": len(text)})
+            start = len(text)
 
         while start < len(text):
             end = min(start + self.chunk_size, len(text))
@@ -184,36 +246,119 @@ class RAGKnowledgePromptAgent:
                 end = start + text[start:end].rindex(separator) + len(separator)
 
             chunks.append({
-                "chunk_id": chunk_id,
+                "chunk_id": self.chunk_id(text[start:end]),
                 "text": text[start:end],
                 "chunk_size": end - start,
                 "start_char": start,
                 "end_char": end
             })
 
+            if end == len(text):
+                break
             start = end - self.chunk_overlap
-            chunk_id += 1
 
         with open(f"chunks-{self.unique_filename}", 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=["text", "chunk_size"])
+            writer = csv.DictWriter(csvfile, fieldnames=["chunk_id", "text", "chunk_size"])
             writer.writeheader()
             for chunk in chunks:
-                writer.writerow({k: chunk[k] for k in ["text", "chunk_size"]})
+                writer.writerow({k: chunk[k] for k in ["chunk_id", "text", "chunk_size"]})
 
         return chunks
 
     def calculate_embeddings(self):
         """
-        Calculates embeddings for each chunk and stores them in a CSV file.
+        Updates the persistent knowledge index with the current chunks.
+
+        Chunks are identified by the hash of their text, so only chunks not yet in the
+        index are embedded, in one batched request. Chunks that disappeared are
+        tombstoned, and restored without embedding if they come back. The index is a
+        normalized float32 .npy matrix with a JSON sidecar of the chunk metadata, and is
+        only rewritten when it changed.
 
         Returns:
         DataFrame: DataFrame containing text chunks and their embeddings.
         """
-        df = pd.read_csv(f"chunks-{self.unique_filename}", encoding='utf-8')
-        df['embeddings'] = df['text'].apply(self.get_embedding)
-        df.to_csv(f"embeddings-{self.unique_filename}", encoding='utf-8', index=False)
+        df = pd.read_csv(f"chunks-{self.unique_filename}", encoding='utf-8', dtype={"chunk_id": str})
+        matrix, index = self._read_index()
+        rows = {entry["chunk_id"]: row for row, entry in enumerate(index)}
+        current = set(df["chunk_id"])
+        changed = False
+
+        for entry in index:
+            deleted = entry["chunk_id"] not in current
+            if entry["deleted"] != deleted:
+                entry["deleted"] = deleted
+                changed = True
+
+        new = df[~df["chunk_id"].isin(rows)].drop_duplicates("chunk_id")
+        if len(new):
+            vectors = self._embed(new["text"].tolist())
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            matrix = vectors if matrix is None else np.vstack([matrix, vectors])
+            for chunk_id, text, chunk_size in new[["chunk_id", "text", "chunk_size"]].itertuples(index=False):
+                rows[chunk_id] = len(index)
+                index.append({"chunk_id": chunk_id, "text": text, "chunk_size": int(chunk_size), "deleted": False})
+            changed = True
+
+        # Drop tombstones once they outnumber the live chunks
+        live = [row for row, entry in enumerate(index) if not entry["deleted"]]
+        if len(index) - len(live) > len(live):
+            matrix, index = matrix[live], [index[row] for row in live]
+            rows = {entry["chunk_id"]: row for row, entry in enumerate(index)}
+            changed = True
+
+        if changed:
+            self._write_index(matrix, index)
+        logger.info("Knowledge index %s: %d chunks, %d embedded, %d tombstoned",
+                    self.index_name, len(current), len(new), sum(e["deleted"] for e in index))
+
+        df['embeddings'] = [matrix[rows[chunk_id]] for chunk_id in df["chunk_id"]]
         return df
 
+    def _read_index(self):
+        """Reads the knowledge index, or returns an empty one if there is none."""
+        if not (os.path.exists(self.embeddings_path) and os.path.exists(self.metadata_path)):
+            return None, []
+        # Read into memory rather than memory-mapped: a mapped file can't be replaced on Windows
+        matrix = np.load(self.embeddings_path)
+        with open(self.metadata_path, encoding='utf-8') as f:
+            index = json.load(f)
+        if len(index) != len(matrix):
+            # Interrupted between the two writes: rebuild (embeddings still come from the cache)
+            return None, []
+        return matrix, index
+
+    def _write_index(self, matrix, index):
+        """Writes the knowledge index atomically."""
+        with open(f"{self.embeddings_path}.tmp", "wb") as f:
+            np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+        with open(f"{self.metadata_path}.tmp", "w", encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(f"{self.embeddings_path}.tmp", self.embeddings_path)
+        os.replace(f"{self.metadata_path}.tmp", self.metadata_path)
+        self._knowledge = None
+
+    def load_knowledge(self):
+        """
+        Reads the embedding matrix and the chunk metadata, again only when the index
+        was rewritten, by this agent or any other.
+
+        Returns:
+        tuple: (embedding matrix, list of chunk metadata dictionaries, boolean mask of
+        the live, not tombstoned, rows).
+        """
+        # The metadata is replaced last, so its stat changes with every write
+        version = None
+        if os.path.exists(self.metadata_path):
+            stat = os.stat(self.metadata_path)
+            version = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if self._knowledge is None or version != self._knowledge_version:
+            matrix, chunks = self._read_index()
+            live = np.array([not chunk["deleted"] for chunk in chunks], dtype=bool)
+            self._knowledge = (matrix, chunks, live)
+            self._knowledge_version = version
+        return self._knowledge
+
     def find_prompt_in_knowledge(self, prompt):
         """
         Finds and responds to a prompt based on similarity with embedded knowledge.
@@ -224,12 +369,13 @@ class RAGKnowledgePromptAgent:
         Returns:
         str: Response derived from the most similar chunk in knowledge.
         """
-        prompt_embedding = self.get_embedding(prompt)
-        df = pd.read_csv(f"embeddings-{self.unique_filename}", encoding='utf-8')
-        df['embeddings'] = df['embeddings'].apply(lambda x: np.array(eval(x)))
-        df['similarity'] = df['embeddings'].apply(lambda emb: self.calculate_similarity(prompt_embedding, emb))
+        prompt_embedding = self._embed([prompt])[0]
+        matrix, chunks, live = self.load_knowledge()
+        # Rows are normalized: one matrix-vector product gives every cosine similarity
+        similarities = matrix @ (prompt_embedding / np.linalg.norm(prompt_embedding))
+        similarities[~live] = -np.inf
 
-        best_chunk = df.loc[df['similarity'].idxmax(), 'text']
+        best_chunk = chunks[int(np.argmax(similarities))]["text"]
 
         client = OpenAI(base_url="https://openai.vocareum.com/v1", api_key=self.openai_api_key)
         response = client.chat.completions.create(
@@ -260,15 +406,15 @@ class EvaluationAgent:
         prompt_to_evaluate = initial_prompt
 
         for i in range(self.max_interactions):# TODO: 2 - Set loop to iterate up to the maximum number of interactions:
-            print(f"\n--- Interaction {i+1} ---")
+            logger.info("\n--- Interaction %d ---", i + 1)
 
-            print(" Step 1: Worker agent generates a response to the prompt")
-            print(f"Prompt:\n{prompt_to_evaluate}")
+            logger.info(" Step 1: Worker agent generates a response to the prompt")
+            logger.info("Prompt:\n%s", prompt_to_evaluate)
             response_from_worker = self.worker_agent.respond(prompt_to_evaluate)
             # TODO: 3 - Obtain a response from the worker agent
-            print(f"Worker Agent Response:\n{response_from_worker}")
+            logger.info("Worker Agent Response:\n%s", response_from_worker)
 
-            print(" Step 2: Evaluator agent judges the response")
+            logger.info(" Step 2: Evaluator agent judges the response")
             eval_prompt = (
                 f"Does the following answer: {response_from_worker}\n"
                 f"Meet this criteria: {self.evaluation_criteria}"  # TODO: 4 - Insert evaluation criteria here
@@ -284,14 +430,14 @@ class EvaluationAgent:
                 temperature=0
             )
             evaluation = response.choices[0].message.content.strip()
-            print(f"Evaluator Agent Evaluation:\n{evaluation}")
+            logger.info("Evaluator Agent Evaluation:\n%s", evaluation)
 
-            print(" Step 3: Check if evaluation is positive")
+            logger.info(" Step 3: Check if evaluation is positive")
             if evaluation.lower().startswith("yes"):
-                print("✅ Final solution accepted.")
+                logger.info("✅ Final solution accepted.")
                 break
             else:
-                print(" Step 4: Generate instructions to correct the response")
+                logger.info(" Step 4: Generate instructions to correct the response")
                 instruction_prompt = (
                     f"Provide instructions to fix an answer based on these reasons why it is incorrect: {evaluation}"
                 )
@@ -305,9 +451,9 @@ class EvaluationAgent:
                     # TODO: 6 - Define the message structure sent to the LLM to generate correction instructions (use temperature=0)
                 )
                 instructions = response.choices[0].message.content.strip()
-                print(f"Instructions to fix:\n{instructions}")
+                logger.info("Instructions to fix:\n%s", instructions)
 
-                print(" Step 5: Send feedback to worker agent for refinement")
+                logger.info(" Step 5: Send feedback to worker agent for refinement")
                 prompt_to_evaluate = (
                     f"The original prompt was: {initial_prompt}\n"
                     f"The response to that prompt was: {response_from_worker}\n"
@@ -324,50 +470,92 @@ class EvaluationAgent:
 
 class RoutingAgent():
 
-    def __init__(self, openai_api_key, agents):
+    def __init__(self, openai_api_key, agents, embedding_cache=None, threshold=None):
         # Initialize the agent with given attributes
         self.openai_api_key = openai_api_key
+        # Agent descriptions and repeated prompts are only embedded once
+        self.embedding_cache = embedding_cache or get_default_cache()
+        # Minimum similarity for a prompt to be routed, None to always route
+        self.threshold = threshold
         # TODO: 1 - Define an attribute to hold the agents, call it agents
         self.agents = agents
 
+    @property
+    def agents(self):
+        return self._agents
+
+    @agents.setter
+    def agents(self, agents):
+        # Embed and normalize all the route descriptions once, as one matrix
+        self._agents = agents
+        self._build_route_matrix()
+
+    def _route_descriptions(self):
+        return tuple(agent.get("description", "") for agent in self._agents or [])
+
+    def _build_route_matrix(self):
+        routes = [agent for agent in self._agents or [] if agent.get("description", "")]
+        self._routes = routes
+        self._route_key = self._route_descriptions()
+        if not routes:
+            self._route_matrix = None
+            return
+        matrix = self._embed([agent["description"] for agent in routes])
+        self._route_matrix = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    def _embed(self, texts):
+        def embed(texts):
+            client = OpenAI(api_key=self.openai_api_key)
+            response = client.embeddings.create(
+                model="text-embedding-3-large",
+                input=texts
+            )
+            return [item.embedding for item in response.data]
+
+        return self.embedding_cache.embed(texts, embed, "text-embedding-3-large")
+
     def get_embedding(self, text):
-        client = OpenAI(api_key=self.openai_api_key)
         # TODO: 2 - Write code to calculate the embedding of the text using the text-embedding-3-large model
         # Extract and return the embedding vector from the response
-        response = client.embeddings.create(
-            model="text-embedding-3-large",
-            input=text
-        )
-        embedding = response.data[0].embedding
-        return embedding 
+        return self._embed([text])[0].tolist()
+
+    def rank(self, user_input, top_k=None):
+        """
+        Scores every route against the user prompt with one matrix-vector product.
+
+        Parameters:
+        user_input (str): The user prompt.
+        top_k (int): Number of routes to return. Defaults to all of them.
+
+        Returns:
+        list: (agent, similarity) tuples, most similar first.
+        """
+        # Descriptions edited in place since the matrix was built
+        if self._route_descriptions() != self._route_key:
+            self._build_route_matrix()
+        if self._route_matrix is None:
+            return []
+
+        input_emb = self._embed([user_input])[0]
+        similarities = self._route_matrix @ (input_emb / np.linalg.norm(input_emb))
+        order = np.argsort(-similarities)[:top_k]
+        return [(self._routes[i], float(similarities[i])) for i in order]
 
     # TODO: 3 - Define a method to route user prompts to the appropriate agent
     def route(self, user_input):
         # TODO: 4 - Compute the embedding of the user input prompt
-        input_emb = self.get_embedding(user_input) 
-        best_agent = None
-        best_score = -1
-
-        for agent in self.agents:
-            # TODO: 5 - Compute the embedding of the agent description
-            agent_desc = agent.get("description", "")
-            if not agent_desc:
-                continue
-            agent_emb = self.get_embedding(agent_desc)
-            if agent_emb is None:
-                continue
-
-            similarity = np.dot(input_emb, agent_emb) / (np.linalg.norm(input_emb) * np.linalg.norm(agent_emb))
-            print(similarity)
+        # TODO: 5 - Compute the embedding of the agent description
+        # TODO: 6 - Add logic to select the best agent based on the similarity score between the user prompt and the agent descriptions
+        ranking = self.rank(user_input, top_k=1)
+        if not ranking:
+            return "Sorry, no suitable agent could be selected."
 
-            # TODO: 6 - Add logic to select the best agent based on the similarity score between the user prompt and the agent descriptions
-            if similarity > best_score:
-                best_score = similarity
-                best_agent = agent
-        if best_agent is None:
+        best_agent, best_score = ranking[0]
+        logger.debug("Similarity to %s: %s", best_agent["name"], best_score)
+        if self.threshold is not None and best_score < self.threshold:
             return "Sorry, no suitable agent could be selected."
 
-        print(f"[Router] Best agent: {best_agent['name']} (score={best_score:.3f})")
+        logger.info("[Router] Best agent: %s (score=%.3f)", best_agent["name"], best_score)
         return best_agent["func"](user_input)
 
 
@@ -1,9 +1,37 @@
 """Provides utility functions for the project."""
 
+import logging
+import sys
 from enum import Enum
 
 SINGLE_TAB_LEVEL = 4
 
+class _ConsoleHandler(logging.StreamHandler):
+    """Default output: plain messages on stdout. Once the application configures logging,
+    records only propagate to its handlers."""
+
+    def emit(self, record):
+        if not logging.getLogger().handlers:
+            super().emit(record)
+
+
+# Chat messages are logged at INFO level and rendered in a box only when the
+# level is enabled. Use `set_log_level(logging.WARNING)` for a quiet mode that
+# skips the rendering entirely. They go to stdout until the application
+# configures logging, then propagate to its handlers.
+logger = logging.getLogger("project_lib")
+if not logger.handlers:
+    _handler = _ConsoleHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+if logger.level == logging.NOTSET:
+    logger.setLevel(logging.INFO)
+
+
+def set_log_level(level):
+    """Set the level of the chat message logs, e.g. logging.WARNING to silence them."""
+    logger.setLevel(level)
+
 
 class Interest(str, Enum):
     ART = "art"
@@ -64,21 +92,16 @@ class ChatAgent:
         if role not in ["system", "user", "assistant"]:
             raise ValueError(f"Invalid role: {role}")
         self.messages.append({"role": role, "content": content})
+        if not logger.isEnabledFor(logging.INFO):
+            return
         if role == "system":
-            print_in_box(
-                content,
-                f"{self.name} - System Prompt",
-            )
+            title = f"{self.name} - System Prompt"
         elif role == "user":
-            print_in_box(
-                content,
-                f"{self.name} - User Prompt",
-            )
-        elif role == "assistant":
-            print_in_box(
-                content,
-                f"{self.name} - Assistant Response",
-            )
+            title = f"{self.name} - User Prompt"
+        else:
+            title = f"{self.name} - Assistant Response"
+        # The box is only rendered if a handler actually formats the record
+        logger.info("%s", _Boxed(content, title), extra={"agent": self.name, "role": role})
 
     def reset(self):
         """Reset the chat history and re-initialize with the system prompt.
@@ -132,15 +155,18 @@ class ChatAgent:
         return self.get_response(add_to_messages=add_to_messages, model=model, **kwargs)
 
 
-def print_in_box(text, title="", cols=120, tab_level=0):
+def format_in_box(text, title="", cols=120, tab_level=0):
     """
-    Prints the given text in a box with the specified title and dimensions.
+    Formats the given text in a box with the specified title and dimensions.
 
     Args:
-        text: The text to print in the box.
+        text: The text to put in the box.
         title: The title of the box.
         cols: The width of the box.
         tab_level: The level of indentation for the box.
+
+    Returns:
+        str: The box, as a multi-line string.
     """
     import textwrap
 
@@ -158,35 +184,201 @@ def print_in_box(text, title="", cols=120, tab_level=0):
         + "\u2550" * (cols - 2 - tab_level * SINGLE_TAB_LEVEL)
         + "\u2557"
     )
+    lines = []
     if tab_level == 0:
-        print()  # Print a newline before any box at level 0
+        lines.append("")  # Add a newline before any box at level 0
 
     if title:
         # replace the middle of the top with the title
         title = "[ " + title + " ]"
         top = top[: (cols - len(title)) // 2] + title + top[(cols + len(title)) // 2 :]
-    print(top)
+    lines.append(top)
 
     for line in text.split("\n"):
         for wrapped_line in textwrap.wrap(
             line, cols - 4 - tab_level * SINGLE_TAB_LEVEL
         ):
-            print(
+            lines.append(
                 f"{tabs}\u2551 {wrapped_line:<{cols - 4 - tab_level * SINGLE_TAB_LEVEL}} \u2551"
             )
 
-    print(
+    lines.append(
         f"{tabs}\u255a"
         + "\u2550" * (cols - 2 - tab_level * SINGLE_TAB_LEVEL)
         + "\u255d"
     )
+    return "\n".join(lines)
+
+
+def print_in_box(text, title="", cols=120, tab_level=0):
+    """
+    Prints the given text in a box with the specified title and dimensions.
+
+    Args:
+        text: The text to print in the box.
+        title: The title of the box.
+        cols: The width of the box.
+        tab_level: The level of indentation for the box.
+    """
+    print(format_in_box(text, title, cols, tab_level))
+
+
+class _Boxed:
+    """Defers `format_in_box` until a log record is actually formatted."""
 
+    def __init__(self, text, title):
+        self.text = text
+        self.title = title
 
-def do_chat_completion(messages: list[dict[str, str]], model=None, client=None, **kwargs):
+    def __str__(self):
+        return format_in_box(self.text, self.title)
+
+
+class ResponseCache:
+    """A cache of chat completion responses for deterministic (temperature=0) calls.
+
+    Responses are keyed by a hash of the model, messages and request options.
+    Recent responses are kept in memory; with a `path`, they are also stored in
+    a SQLite database so repeated runs of the same prompts are free.
+
+    Args:
+        max_entries: Maximum number of responses kept in memory.
+        ttl: Optional lifetime of a response in seconds.
+        path: Optional SQLite database storing the responses on disk.
+        max_disk_entries: Maximum number of responses kept on disk.
+
+    Examples:
+        >>> cache = ResponseCache()
+        >>> key = cache.make_key("gpt-4o-mini", [{"role": "user", "content": "Hi"}], temperature=0)
+        >>> cache.get(key) is None
+        True
+        >>> cache.put(key, "Hello!")
+        >>> cache.get(key)
+        'Hello!'
+        >>> cache.stats()["hit_rate"]
+        0.5
+    """
+
+    def __init__(self, max_entries=1024, ttl=None, path=None, max_disk_entries=100_000):
+        import sqlite3
+        import threading
+        from collections import OrderedDict
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._disk_entries = 0
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_created ON responses (created)"
+            )
+            self._conn.commit()
+            self._disk_entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(model, messages, **kwargs):
+        """Hash the parameters of a chat completion request."""
+        import hashlib
+        import json
+
+        def jsonable(value):
+            # Structured output formats are pydantic models, keyed by their schema
+            if hasattr(value, "model_json_schema"):
+                return {"name": value.__name__, "schema": value.model_json_schema()}
+            return repr(value)
+
+        request = {"model": model, "messages": messages, **kwargs}
+        canonical = json.dumps(request, sort_keys=True, default=jsonable)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _expired(self, created):
+        import time
+
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, key):
+        """Get a cached response, or None on a miss."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None and self._conn is not None:
+                entry = self._conn.execute(
+                    "SELECT created, value FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+            if entry is not None and not self._expired(entry[0]):
+                self._remember(key, entry)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """Store a response."""
+        import time
+
+        entry = (time.time(), value)
+        with self._lock:
+            self._remember(key, entry)
+            if self._conn is not None:
+                with self._conn:
+                    cursor = self._conn.execute(
+                        "UPDATE responses SET value = ?, created = ? WHERE key = ?",
+                        (value, entry[0], key),
+                    )
+                    if cursor.rowcount == 0:
+                        self._conn.execute(
+                            "INSERT INTO responses VALUES (?, ?, ?)", (key, value, entry[0])
+                        )
+                        self._disk_entries += 1
+                    if self._disk_entries > self.max_disk_entries:
+                        self._evict_disk()
+
+    def _evict_disk(self):
+        """Drop the oldest responses on disk, leaving 10% headroom so eviction
+        doesn't run on every put."""
+        keep = int(self.max_disk_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+            "ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (keep,),
+        )
+        self._disk_entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        """Get the hit and miss counters of the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_entries,
+            }
+
+
+def do_chat_completion(messages: list[dict[str, str]], model=None, client=None, cache=None, **kwargs):
     """A simple wrapper around OpenAI's chat completion API.
 
     Args:
         messages: A list of messages to send to the chat completion API.
+        cache: An optional ResponseCache. Only used for calls with temperature=0.
 
     Returns:
         str: The response from the chat completion API.
@@ -218,6 +410,13 @@ def do_chat_completion(messages: list[dict[str, str]], model=None, client=None,
     if model is None:
         raise ValueError("A valid model must be provided.")
 
+    key = None
+    if cache is not None and kwargs.get("temperature") == 0:
+        key = cache.make_key(model, messages, **kwargs)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
     if "response_format" not in kwargs:
         response = client.chat.completions.create(  # type: ignore
             model=model,
@@ -236,7 +435,10 @@ def do_chat_completion(messages: list[dict[str, str]], model=None, client=None,
             f"OpenAI API returned an error: {str(response.error)}"
         )
 
-    return response.choices[0].message.content
+    content = response.choices[0].message.content
+    if key is not None and content is not None:
+        cache.put(key, content)
+    return content
 
 
 ACTIVITY_CALENDAR = [